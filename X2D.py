@@ -1,6 +1,8 @@
 import construct.core
 import io
+import struct
 
+from collections import namedtuple
 from construct import *
 from enum import IntEnum
 
@@ -240,11 +242,27 @@ MeterReadingMessage = Struct(
 # Functions
 #
 
+# Header and checksum, plus the rolling code when the header flags one
+X2D_MIN_FRAME_LENGTH = 8
+X2D_MIN_ROLLING_CODE_FRAME_LENGTH = X2D_MIN_FRAME_LENGTH + 2
+
+
 def x2d_crc(data):
-    crc = 0
-    for i in data:
-        crc += int(i)
-    return int((~crc) + 1) & 0xFFFF
+    return -sum(data) & 0xFFFF
+
+
+def check_x2d_frame(data):
+    # The sum of the body plus the big endian checksum is 0
+    if data is None or len(data) < X2D_MIN_FRAME_LENGTH:
+        return False
+    if data[5] & 0x08 and len(data) < X2D_MIN_ROLLING_CODE_FRAME_LENGTH:
+        return False
+    return (sum(data) + 255 * data[-2]) & 0xFFFF == 0
+
+
+def check_x2d_frames(frames):
+    # Same as check_x2d_frame on many frames, without parsing any of them
+    return list(map(check_x2d_frame, frames))
 
 
 class OffsettedEnd(Subconstruct):
@@ -347,9 +365,463 @@ _x2d_struct = Struct(
 )
 
 
-def parse_x2d_message(data):
-    return _x2d_struct.parse(bytearray(data)).body.value
+#
+# Fast parsing
+#
+# Hand written parsing of _x2d_struct for the frames it knows, building the
+# same Containers (without the "_io" entries). Anything else returns None
+# and goes through Construct.
+#
+
+def _enum_decoder(enum):
+    mapping = {int(e): EnumIntegerString.new(int(e), e.name) for e in enum}
+    return lambda value: mapping[value] if value in mapping else EnumInteger(value)
+
+
+_decode_device = _enum_decoder(Device)
+_decode_attribute = _enum_decoder(Attribute)
+_decode_message_data_type = _enum_decoder(MessageDataType)
+_decode_functioning_mode = _enum_decoder(FunctioningMode)
+_decode_basic_command = _enum_decoder(BasicCommand)
+_decode_variation_command = _enum_decoder(VariationCommand)
+_decode_register_selection = _enum_decoder(RegisterSelection)
+
+
+def _flags(value, names, **fields):
+    flags = Container((name, bool(value & (0x80 >> i))) for i, name in enumerate(names))
+    flags.update(fields)
+    return flags
+
+
+def _parse_functioning_level(payload):
+    if len(payload) < 1:
+        return None, 0
+    flags = _flags(payload[0], ["manual", "duration", "f5", "f4"], mode=_decode_functioning_mode(payload[0] & 0x0F))
+    duration = int.from_bytes(payload[1:3], 'big') if len(payload) >= 3 else None
+    return Container(flags=flags, duration=duration), 3 if duration is not None else 1
+
+
+def _parse_basic_command(payload):
+    if len(payload) < 1:
+        return None, 0
+    return Container(command=_decode_basic_command(payload[0])), 1
+
+
+def _parse_variation_command(payload):
+    if len(payload) < 3:
+        return None, 0
+    return Container(command=_decode_variation_command(payload[0]), dummy1=payload[1], dummy2=payload[2]), 3
+
+
+def _parse_temperature(payload):
+    if len(payload) < 2:
+        return None, 0
+    return Container(temperature=int.from_bytes(payload[0:2], 'little') / 512), 2
+
+
+def _parse_meter_reading(payload):
+    if len(payload) < 5:
+        return None, 0
+    return Container(selection=_decode_register_selection(payload[0]),
+                     currentTariff=_flags(payload[1], ["f7", "double", "ejp", "euro", "f3", "f2", "f1", "f0"]),
+                     register=int.from_bytes(payload[2:5], 'little')), 5
+
+
+_content_parsers = {
+    MessageDataType.Enrollment: lambda payload: (Container(), 0),
+    MessageDataType.BasicCommand: _parse_basic_command,
+    MessageDataType.HeatingLevel: _parse_functioning_level,
+    MessageDataType.FunctioningLevel: _parse_functioning_level,
+    MessageDataType.VariationCommand: _parse_variation_command,
+    MessageDataType.InternalTemperature: _parse_temperature,
+    MessageDataType.MeterReading: _parse_meter_reading,
+    MessageDataType.CurrentLevel: _parse_functioning_level,
+}
+
+
+def _parse_x2d_message_fast(data):
+    data = bytes(data)
+    if not check_x2d_frame(data):
+        return None
+    body = data[:-2]
+    rolling_code = body[5] & 0x08
+    end = len(body) - 2 if rolling_code else len(body)
+    if end < 6:
+        return None
+    payload = body[6:end]
+
+    if body[4] & 0x0F != Attribute.WithData:
+        value, raw = None, b''
+    else:
+        if len(payload) < 1:
+            return None
+        parser = _content_parsers.get(payload[0])
+        if parser is None:
+            content, length = payload[1:], len(payload) - 1
+        else:
+            content, length = parser(payload[1:])
+        value = Container(type=_decode_message_data_type(payload[0]), content=content)
+        raw = payload[:1 + length]
+
+    return Container(
+        house=int.from_bytes(body[0:2], 'big'),
+        source=Container(id=body[2] >> 6, type=_decode_device(body[2] & 0x3F)),
+        recipient=_flags(body[3], ["f7", "f6", "f5", "f4"], zone=body[3] & 0x0F),
+        transmitter=_flags(body[4], ["enrollment_requested", "internal_fault_detected", "box_opened", "battery_failing"],
+                           attribute=_decode_attribute(body[4] & 0x0F)),
+        control=_flags(body[5], ["f7", "f6", "f5", "f4", "rolling_code", "answer_request", "f1", "f0"]),
+        data=Container(data=raw, value=value, offset1=0, offset2=len(raw), length=len(raw)),
+        rollingCode=int.from_bytes(body[-2:], 'big') if rolling_code else None,
+    )
+
+
+#
+# Slotted messages
+#
+# Immutable tuples instead of Containers, built from the bytes of the frames
+# like the fast parsing. The enumerations are IntEnum members, or ints for the
+# unknown values. The parts of the header only depend on one byte each, they
+# are built once and shared by all the messages.
+#
+
+Source = namedtuple("Source", ["id", "type"])
+Recipient = namedtuple("Recipient", ["f7", "f6", "f5", "f4", "zone"])
+Transmitter = namedtuple("Transmitter", ["enrollment_requested", "internal_fault_detected", "box_opened",
+                                         "battery_failing", "attribute"])
+Control = namedtuple("Control", ["f7", "f6", "f5", "f4", "rolling_code", "answer_request", "f1", "f0"])
+Data = namedtuple("Data", ["type", "content"])
+
+EnrollmentContent = namedtuple("EnrollmentContent", [])
+FunctioningLevelFlags = namedtuple("FunctioningLevelFlags", ["manual", "duration", "f5", "f4", "mode"])
+FunctioningLevelContent = namedtuple("FunctioningLevelContent", ["flags", "duration"])
+TemperatureContent = namedtuple("TemperatureContent", ["temperature"])
+BasicCommandContent = namedtuple("BasicCommandContent", ["command"])
+VariationCommandContent = namedtuple("VariationCommandContent", ["command", "dummy1", "dummy2"])
+TariffFlags = namedtuple("TariffFlags", ["f7", "double", "ejp", "euro", "f3", "f2", "f1", "f0"])
+MeterReadingContent = namedtuple("MeterReadingContent", ["selection", "currentTariff", "register"])
+
+
+def _to_dict(value):
+    if isinstance(value, tuple) and hasattr(value, "_asdict"):
+        return {k: _to_dict(v) for k, v in value._asdict().items()}
+    return value
+
+
+class Message(namedtuple("Message", ["house", "source", "recipient", "transmitter", "control", "data",
+                                     "rolling_code"])):
+    __slots__ = ()
+
+    def to_dict(self):
+        # Same form as the Containers, accepted by format_x2d_message
+        return dict(house=self.house, source=self.source._asdict(), recipient=self.recipient._asdict(),
+                    transmitter=self.transmitter._asdict(), control=self.control._asdict(),
+                    data=dict(value=_to_dict(self.data)), rollingCode=self.rolling_code)
+
+
+def _enum_value(enum):
+    mapping = {int(e): e for e in enum}
+    return lambda value: mapping.get(value, value)
+
+
+def _bits(value, count):
+    return tuple(bool(value & (0x80 >> i)) for i in range(count))
+
+
+_device = _enum_value(Device)
+_attribute = _enum_value(Attribute)
+_message_data_type = _enum_value(MessageDataType)
+_functioning_mode = _enum_value(FunctioningMode)
+_basic_command = _enum_value(BasicCommand)
+_variation_command = _enum_value(VariationCommand)
+_register_selection = _enum_value(RegisterSelection)
+
+_sources = [Source(b >> 6, _device(b & 0x3F)) for b in range(256)]
+_recipients = [Recipient(*_bits(b, 4), b & 0x0F) for b in range(256)]
+_transmitters = [Transmitter(*_bits(b, 4), _attribute(b & 0x0F)) for b in range(256)]
+_controls = [Control(*_bits(b, 8)) for b in range(256)]
+_functioning_level_flags = [FunctioningLevelFlags(*_bits(b, 4), _functioning_mode(b & 0x0F)) for b in range(256)]
+_tariffs = [TariffFlags(*_bits(b, 8)) for b in range(256)]
+_enrollment = EnrollmentContent()
+
+
+def _slot_functioning_level(payload):
+    if len(payload) < 1:
+        return None, 0
+    duration = int.from_bytes(payload[1:3], 'big') if len(payload) >= 3 else None
+    return FunctioningLevelContent(_functioning_level_flags[payload[0]], duration), 3 if duration is not None else 1
+
+
+def _slot_basic_command(payload):
+    if len(payload) < 1:
+        return None, 0
+    return BasicCommandContent(_basic_command(payload[0])), 1
+
+
+def _slot_variation_command(payload):
+    if len(payload) < 3:
+        return None, 0
+    return VariationCommandContent(_variation_command(payload[0]), payload[1], payload[2]), 3
+
+
+def _slot_temperature(payload):
+    if len(payload) < 2:
+        return None, 0
+    return TemperatureContent(int.from_bytes(payload[0:2], 'little') / 512), 2
+
+
+def _slot_meter_reading(payload):
+    if len(payload) < 5:
+        return None, 0
+    return MeterReadingContent(_register_selection(payload[0]), _tariffs[payload[1]],
+                               int.from_bytes(payload[2:5], 'little')), 5
+
+
+_content_slotters = {
+    MessageDataType.Enrollment: lambda payload: (_enrollment, 0),
+    MessageDataType.BasicCommand: _slot_basic_command,
+    MessageDataType.HeatingLevel: _slot_functioning_level,
+    MessageDataType.FunctioningLevel: _slot_functioning_level,
+    MessageDataType.VariationCommand: _slot_variation_command,
+    MessageDataType.InternalTemperature: _slot_temperature,
+    MessageDataType.MeterReading: _slot_meter_reading,
+    MessageDataType.CurrentLevel: _slot_functioning_level,
+}
+
+
+def _parse_x2d_message_slotted(data):
+    # Same frames as _parse_x2d_message_fast, None for the others
+    data = bytes(data)
+    if not check_x2d_frame(data):
+        return None
+    body = data[:-2]
+    rolling_code = body[5] & 0x08
+    end = len(body) - 2 if rolling_code else len(body)
+    if end < 6:
+        return None
+    payload = body[6:end]
+
+    if body[4] & 0x0F != Attribute.WithData:
+        value = None
+    else:
+        if len(payload) < 1:
+            return None
+        slotter = _content_slotters.get(payload[0])
+        content = payload[1:] if slotter is None else slotter(payload[1:])[0]
+        value = Data(_message_data_type(payload[0]), content)
+
+    return Message(int.from_bytes(body[0:2], 'big'), _sources[body[2]], _recipients[body[3]],
+                   _transmitters[body[4]], _controls[body[5]], value,
+                   int.from_bytes(body[-2:], 'big') if rolling_code else None)
+
+
+def slot_x2d_message(msg):
+    # Slotted message of a Container, through its frame
+    if isinstance(msg, Message):
+        return msg
+    slotted = _parse_x2d_message_slotted(format_x2d_message(msg))
+    if slotted is None:
+        raise Exception(f"Message can't be slotted: {msg}")
+    return slotted
+
+
+#
+# Lazy messages
+#
+# The header fields are read from the bytes of the frame through the shared
+# tables of the slotted messages, which is enough to filter the messages. The
+# data and the rolling code are only parsed when they are accessed.
+#
+
+class LazyMessage(object):
+    # Message of a valid frame. A payload that can't be parsed raises on the
+    # first access to the data or the rolling code.
+    __slots__ = ("_frame", "_message")
+
+    def __init__(self, frame):
+        self._frame = frame
+        self._message = None
+
+    @property
+    def frame(self):
+        return self._frame
+
+    @property
+    def house(self):
+        return int.from_bytes(self._frame[0:2], 'big')
+
+    @property
+    def source(self):
+        return _sources[self._frame[2]]
+
+    @property
+    def recipient(self):
+        return _recipients[self._frame[3]]
+
+    @property
+    def transmitter(self):
+        return _transmitters[self._frame[4]]
+
+    @property
+    def control(self):
+        return _controls[self._frame[5]]
+
+    @property
+    def data(self):
+        return self.message.data
+
+    @property
+    def rolling_code(self):
+        return self.message.rolling_code
+
+    @property
+    def message(self):
+        if self._message is None:
+            msg = _parse_x2d_message_slotted(self._frame)
+            if msg is None:
+                msg = slot_x2d_message(_x2d_struct.parse(bytearray(self._frame)).body.value)
+            self._message = msg
+        return self._message
+
+    def to_dict(self):
+        return self.message.to_dict()
+
+    def __eq__(self, other):
+        if isinstance(other, LazyMessage):
+            return self._frame == other._frame
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self._frame)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._frame!r})"
+
+    def __str__(self):
+        return str(self.message)
+
+
+def _parse_x2d_header(data):
+    # Lazy message of a frame with a valid checksum and a whole header, None
+    # for the others
+    data = bytes(data)
+    if not check_x2d_frame(data):
+        return None
+    return LazyMessage(data)
+
+
+class MessageFilter(object):
+    # Predicate on the frames, from the bytes of their header: the frames of
+    # the given houses, device types, zones and data types. None accepts any
+    # value, the frames without data only pass without data types.
+    def __init__(self, houses=None, devices=None, zones=None, data_types=None):
+        self._houses = None if houses is None else frozenset(int(h) for h in houses)
+        self._devices = None if devices is None else frozenset(int(d) for d in devices)
+        self._zones = None if zones is None else frozenset(int(z) for z in zones)
+        self._data_types = None if data_types is None else frozenset(int(t) for t in data_types)
+
+    def __call__(self, frame):
+        if len(frame) < X2D_MIN_FRAME_LENGTH:
+            return False
+        if frame[5] & 0x08 and len(frame) < X2D_MIN_ROLLING_CODE_FRAME_LENGTH:
+            return False
+        if self._houses is not None and (frame[0] << 8 | frame[1]) not in self._houses:
+            return False
+        if self._devices is not None and frame[2] & 0x3F not in self._devices:
+            return False
+        if self._zones is not None and frame[3] & 0x0F not in self._zones:
+            return False
+        if self._data_types is not None:
+            end = len(frame) - (4 if frame[5] & 0x08 else 2)
+            if frame[4] & 0x0F != Attribute.WithData or end <= 6 or frame[6] not in self._data_types:
+                return False
+        return True
+
+
+#
+# Frozen messages
+#
+
+class FrozenContainer(Container):
+    # Read-only Container, a message can be shared by all its users
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError(f"{type(self).__name__} is read-only")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __hash__(self):
+        return hash(tuple(item for item in self.items() if not item[0].startswith("_")))
+
+    def __reduce__(self):
+        return FrozenContainer, (list(self.items()),)
+
+
+def freeze_x2d_message(msg):
+    if isinstance(msg, dict) and not isinstance(msg, FrozenContainer):
+        return FrozenContainer((k, freeze_x2d_message(v)) for k, v in msg.items() if not k.startswith("_"))
+    return msg
+
+
+def parse_x2d_message(data, fast=True, slotted=False, lazy=False):
+    if lazy:
+        msg = _parse_x2d_header(data)
+        if msg is None:
+            msg = slot_x2d_message(_x2d_struct.parse(bytearray(data)).body.value)
+        return msg
+    if slotted:
+        msg = _parse_x2d_message_slotted(data) if fast else None
+        if msg is None:
+            msg = slot_x2d_message(_x2d_struct.parse(bytearray(data)).body.value)
+        return msg
+    msg = _parse_x2d_message_fast(data) if fast else None
+    if msg is None:
+        msg = _x2d_struct.parse(bytearray(data)).body.value
+    return msg
 
 
 def format_x2d_message(msg):
+    if isinstance(msg, LazyMessage):
+        msg = msg.message
+    if isinstance(msg, Message):
+        msg = msg.to_dict()
     return _x2d_struct.build(dict(body=dict(value=msg)))
+
+
+#
+# Fast building
+#
+
+_pack_checksum = struct.Struct(">H").pack
+_pack_rolling_code_checksum = struct.Struct(">HH").pack
+
+
+class X2DFrameTemplate(object):
+    # Frames of a message whose header doesn't change: the header is built once
+    # by Construct, then only the data and the rolling code are appended and
+    # the checksum is updated with their sum.
+
+    def __init__(self, msg):
+        self._msg = {k: v for k, v in msg.items() if k not in ("data", "rollingCode")}
+        frame = format_x2d_message(dict(self._msg, data=dict(value=dict(type=0xFF, content=b'')), rollingCode=0))
+        self._header = frame[:6]
+        self._sum = sum(self._header)
+        self._with_data = self._header[4] & 0x0F == Attribute.WithData
+        self._rolling_code = bool(self._header[5] & 0x08)
+
+    def format_data(self, value):
+        # Raw data of a message value, built once to be reused by many frames
+        if not self._with_data:
+            return b''
+        frame = format_x2d_message(dict(self._msg, data=dict(value=value), rollingCode=0))
+        return frame[6:len(frame) - (4 if self._rolling_code else 2)]
+
+    def build(self, data=b'', rolling_code=None):
+        if not self._with_data:
+            data = b''
+        if self._rolling_code:
+            if rolling_code is None:
+                raise Exception("Missing rolling code")
+            crc = self._sum + sum(data) + (rolling_code >> 8) + (rolling_code & 0xFF)
+            return self._header + data + _pack_rolling_code_checksum(rolling_code, -crc & 0xFFFF)
+        return self._header + data + _pack_checksum(-(self._sum + sum(data)) & 0xFFFF)
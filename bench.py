@@ -0,0 +1,171 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import time
+
+from encoding import OOK, BiphaseMark, Decimation, Manchester, X2D, X2DMessage, process
+from synthetic import CaptureGenerator, parse_size
+
+SAMPLE_RATE = 2000000
+SYMBOL_RATE = 4820
+DECIMATION = 32
+CHUNK_SIZES = [None, 1 << 16, 1 << 12, 1 << 8]
+
+
+#
+# Corpora
+#
+
+def load_raw(path="raw.bin"):
+    with open(path, 'rb') as file:
+        return bytearray(file.read())
+
+
+def load_baud(path="baud.bin"):
+    with open(path) as file:
+        return bytearray([1 if a == '1' else 0 for a in file.read()])
+
+
+#
+# Measures
+#
+
+def size(data):
+    if len(data) > 0 and not isinstance(data[0], int):
+        return sum(len(d) if isinstance(d, (bytes, bytearray, list)) else 1 for d in data)
+    return len(data)
+
+
+def measure(name, corpus, processors_fct, in_data, frames, chunk_size=None, repeat=3):
+    count_fct = None if chunk_size is None else (lambda x: min(len(x), chunk_size))
+    best = None
+    out_data = None
+    for _ in range(repeat):
+        processors = processors_fct()
+        with contextlib.redirect_stderr(io.StringIO()):
+            start = time.perf_counter()
+            out_data = process(processors, in_data, count_fct)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        "name": name,
+        "corpus": corpus,
+        "chunk_size": chunk_size,
+        "input_size": size(in_data),
+        "frames": frames,
+        "seconds": best,
+        "mb_per_s": size(in_data) / best / 1e6 if best > 0 else None,
+        "frames_per_s": frames / best if best > 0 else None,
+    }, out_data
+
+
+def ook_decoder(**kwargs):
+    return OOK.Decoder(SAMPLE_RATE, SYMBOL_RATE, throw=False, **kwargs)
+
+
+def bench_corpus(corpus, samples, chunk_sizes, repeat):
+    results = []
+
+    chain = lambda **kwargs: [ook_decoder(**kwargs), BiphaseMark.Decoder(), X2D.Decoder(throw=False),
+                              X2DMessage.Decoder(check=True)]
+    decimated_chain = lambda: [Decimation.Decoder(DECIMATION, vectorized=True)] + \
+        chain(vectorized=True, decimation=DECIMATION)
+    with contextlib.redirect_stderr(io.StringIO()):
+        frames = len(process(chain(vectorized=True), samples))
+
+    def run(name, processors_fct, in_data, chunk_size=None):
+        result, out_data = measure(name, corpus, processors_fct, in_data, frames, chunk_size, repeat)
+        results.append(result)
+        return out_data
+
+    # The inputs of each stage are the outputs of the previous one
+    symbols = run("OOK.Decoder", lambda: [ook_decoder()], samples)
+    run("OOK.Decoder(vectorized)", lambda: [ook_decoder(vectorized=True)], samples)
+    decimated = run("Decimation.Decoder(vectorized)", lambda: [Decimation.Decoder(DECIMATION, vectorized=True)],
+                    samples)
+    run("OOK.Decoder(decimated)", lambda: [ook_decoder(vectorized=True, decimation=DECIMATION)], decimated)
+    bits = run("BiphaseMark.Decoder", lambda: [BiphaseMark.Decoder()], symbols)
+    x2d_frames = run("X2D.Decoder", lambda: [X2D.Decoder(throw=False)], bits)
+    msgs = run("X2DMessage.Decoder", lambda: [X2DMessage.Decoder(check=True)], x2d_frames)
+
+    run("X2DMessage.Encoder", lambda: [X2DMessage.Encoder()], msgs)
+    run("X2D.Encoder", lambda: [X2D.Encoder()], x2d_frames)
+    run("BiphaseMark.Encoder", lambda: [BiphaseMark.Encoder()], bits)
+    run("OOK.Encoder", lambda: [OOK.Encoder(SAMPLE_RATE, SYMBOL_RATE)], symbols)
+    # Without the initial symbol of the CC1101 chain, the pulse pairs stay aligned
+    manchester = run("Manchester.Encoder", lambda: [Manchester.Encoder(None)], bits)
+    assert process([Manchester.Decoder()], manchester) == bits
+    run("Manchester.Decoder", lambda: [Manchester.Decoder()], manchester)
+
+    for chunk_size in chunk_sizes:
+        run("chain", chain, samples, chunk_size)
+        run("chain(vectorized, packed)", lambda: chain(vectorized=True, packed=True), samples, chunk_size)
+        run("chain(vectorized, decimated)", decimated_chain, samples, chunk_size)
+    return results
+
+
+def bench_baud(bits, chunk_sizes, repeat):
+    chain = lambda: [BiphaseMark.Decoder(), X2D.Decoder(throw=False), X2DMessage.Decoder(check=True)]
+    with contextlib.redirect_stderr(io.StringIO()):
+        frames = len(process(chain(), bits))
+    return [measure("baud chain", "baud.bin", chain, bits, frames, chunk_size, repeat)[0]
+            for chunk_size in chunk_sizes]
+
+
+#
+# Report
+#
+
+def key(result):
+    return result["name"], result["corpus"], result["chunk_size"]
+
+
+def print_results(results, reference=None):
+    reference = {key(r): r for r in (reference or [])}
+    print(f"{'stage':<32} {'corpus':<10} {'chunk':>7} {'MB/s':>9} {'frames/s':>10} {'speedup':>8}")
+    for result in results:
+        old = reference.get(key(result))
+        speedup = f"{old['seconds'] / result['seconds']:.2f}x" if old else ""
+        print(f"{result['name']:<32} {result['corpus']:<10} {str(result['chunk_size'] or '-'):>7} "
+              f"{result['mb_per_s']:>9.3f} {result['frames_per_s']:>10.1f} {speedup:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of the processors, per stage and per chain")
+    parser.add_argument("--synthetic-size", type=parse_size, default=parse_size("16M"),
+                        help="samples of the synthetic capture")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="best time of this number of runs")
+    parser.add_argument("--chunk-sizes", type=int, nargs="*", default=CHUNK_SIZES[1:],
+                        help="chunk sizes of the chains, besides the whole input")
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of a previous run")
+    args = parser.parse_args()
+
+    chunk_sizes = [None] + args.chunk_sizes
+    results = bench_corpus("raw.bin", load_raw(), chunk_sizes, args.repeat)
+    synthetic = CaptureGenerator(args.seed).capture(args.synthetic_size)[0]
+    results += bench_corpus("synthetic", synthetic, chunk_sizes, args.repeat)
+    results += bench_baud(load_baud(), chunk_sizes, args.repeat)
+
+    reference = None
+    if args.compare:
+        with open(args.compare) as file:
+            reference = json.load(file)["results"]
+    print_results(results, reference)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "args": vars(args),
+                "results": results,
+            }, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
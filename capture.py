@@ -0,0 +1,343 @@
+import mmap
+import os
+import stat
+import struct
+import sys
+
+from collections import namedtuple
+
+from encoding import BitBuffer, Processor, seek, stream
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Formats of the capture files: one byte per sample (raw.bin, also the I/Q
+# formats and the RFLink serial logs), one ASCII "0"/"1" per bit (baud.bin),
+# one pulse train per line, durations separated by commas or spaces, or the
+# samples or bits packed 8 per byte after a header
+RAW = "raw"
+BITS = "bits"
+PULSES = "pulses"
+PACKED = "packed"
+
+_BITS_TABLE = bytes(1 if c == ord("1") else 0 for c in range(256))
+_BITS_IGNORED = b" \t\r\n"
+_BITS_TO_ASCII = bytes.maketrans(b"\x00\x01", b"01")
+
+
+#
+# Sources
+#
+
+def read_stream(file, chunk_size=1 << 20):
+    while True:
+        chunk = file.read(chunk_size)
+        if len(chunk) == 0:
+            break
+        yield chunk
+
+
+def open_map(path):
+    # Read only map of the whole file, None for the files that can't be mapped
+    with open(path, 'rb') as file:
+        status = os.fstat(file.fileno())
+        if not stat.S_ISREG(status.st_mode) or status.st_size == 0:
+            return None
+        # The map stays valid once the file is closed
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def read_chunks(path, chunk_size=1 << 20):
+    # Chunks of a capture: zero-copy views of a memory map for the regular
+    # files, plain reads for the pipes and the standard input ("-")
+    return iter(CaptureReader(path, RAW, chunk_size))
+
+
+class CaptureReader(object):
+    # Capture file read by chunks of chunk_size bytes from a memory map, so
+    # that captures larger than the memory are decoded in constant memory:
+    # the pages already read are released as the reading goes. The chunks are
+    # views of the map for the raw files, bits for the ASCII bit files and
+    # lists of pulse trains for the pulse lists. The offsets are in bytes of
+    # the file, except for the ASCII bit files and the packed captures where
+    # they are in bits and samples, as the offsets of their decoding.
+    def __init__(self, path, format=RAW, chunk_size=1 << 20, start=0, stop=None):
+        if format not in (RAW, BITS, PULSES, PACKED):
+            raise Exception(f"Unknown capture format: {format}")
+        if format == PULSES and (start != 0 or stop is not None):
+            raise Exception("Pulse lists are only read from their start")
+        self._path = path
+        self._format = format
+        self._chunk_size = chunk_size
+        self._start = start
+        self._stop = stop
+        # Offset in the file of the next chunk
+        self._offset = start
+
+    @property
+    def offset(self):
+        return self._offset
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def start(self):
+        return self._start
+
+    @property
+    def format(self):
+        return self._format
+
+    def __iter__(self):
+        if self._format == PACKED:
+            return self.packed_chunks()
+        if self._format == BITS:
+            return self.bit_chunks()
+        chunks = self.raw_chunks(self._start, self._stop)
+        if self._format == PULSES:
+            chunks = self.pulse_chunks(chunks)
+        return chunks
+
+    def raw_chunks(self, start, stop):
+        self._offset = start
+        if self._path == "-":
+            yield from self.counted(read_stream(sys.stdin.buffer, self._chunk_size), start, stop)
+            return
+        mapped = open_map(self._path)
+        if mapped is None:
+            with open(self._path, 'rb') as file:
+                yield from self.counted(read_stream(file, self._chunk_size), start, stop)
+            return
+        release = hasattr(mapped, "madvise")
+        if release:
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        view = memoryview(mapped)
+        stop = len(view) if stop is None else min(stop, len(view))
+        released = start - start % mmap.PAGESIZE
+        for start in range(start, stop, self._chunk_size):
+            end = min(start + self._chunk_size, stop)
+            self._offset = end
+            yield view[start:end]
+            # The chunk is done with once the next one is asked for, and the
+            # processors copy what they keep of it: its pages are dropped, they
+            # would be read again from the file if ever needed
+            end -= end % mmap.PAGESIZE
+            if release and end > released:
+                mapped.madvise(mmap.MADV_DONTNEED, released, end - released)
+                released = end
+
+    def counted(self, chunks, start, stop):
+        # Chunks of a file that can't be mapped, read from its start
+        skip = start
+        for chunk in chunks:
+            if skip > 0:
+                chunk, skip = chunk[skip:], max(skip - len(chunk), 0)
+            if stop is not None and self._offset + len(chunk) >= stop:
+                chunk = chunk[:stop - self._offset]
+            self._offset += len(chunk)
+            if len(chunk) > 0:
+                yield chunk
+            if stop is not None and self._offset >= stop:
+                break
+
+    def packed_chunks(self):
+        # The bytes holding the samples from start to stop, unpacked
+        if self._path == "-":
+            raise Exception("Packed captures are only read from files")
+        header = read_header(self._path)
+        stop = header.length if self._stop is None else min(self._stop, header.length)
+        position = self._start - self._start % 8
+        chunks = self.raw_chunks(header.size + (position >> 3), header.size + ((stop + 7) >> 3))
+        for chunk in chunks:
+            bits = unpack_bits(chunk)
+            first = max(self._start - position, 0)
+            position += len(bits)
+            self._offset = min(position, stop)
+            yield bits[first:len(bits) - (position - self._offset)]
+
+    def bit_chunks(self):
+        # The bits from start to stop: the file is read from its start since
+        # the ignored characters don't hold bits
+        position = 0
+        for chunk in self.raw_chunks(0, None):
+            bits = bytes(chunk).translate(_BITS_TABLE, _BITS_IGNORED)
+            first = max(self._start - position, 0)
+            position += len(bits)
+            self._offset = position if self._stop is None else min(position, self._stop)
+            if first < len(bits) - (position - self._offset):
+                yield bits[first:len(bits) - (position - self._offset)]
+            if self._stop is not None and position >= self._stop:
+                break
+
+    def pulse_chunks(self, chunks):
+        # The last line of a chunk is completed by the next chunk
+        rest = b""
+        for chunk in chunks:
+            offset = self._offset - len(chunk) - len(rest)
+            lines = (rest + chunk).split(b"\n")
+            rest = lines.pop()
+            yield self.parse_pulses(lines, offset)
+        if len(rest.strip()) > 0:
+            yield self.parse_pulses([rest], self._offset - len(rest))
+
+    def parse_pulses(self, lines, offset):
+        trains = []
+        for line in lines:
+            try:
+                pulses = list(map(int, line.replace(b",", b" ").split()))
+            except ValueError:
+                raise Exception(f"Invalid pulse train at offset {offset} of {self._path}")
+            if len(pulses) > 0:
+                trains.append(pulses)
+            offset += len(line) + 1
+        return trains
+
+
+def decode(processors, capture, count_fct=None):
+    # Stream the chunks of the capture through the processors. The offsets of
+    # the traces and errors of the sample stages are the offsets in the file,
+    # in samples or bits, for a capture read from the middle of a file.
+    if capture.format != PULSES:
+        seek(processors, capture.start)
+    return stream(processors, capture, count_fct)
+
+
+#
+# Packed captures
+#
+
+# Header of the packed captures, little endian: magic, version, size of the
+# header, sample and symbol rates (equal for a capture of symbols) and length
+# in samples. The samples follow, MSB first as in a BitBuffer.
+CaptureHeader = namedtuple("CaptureHeader", ["size", "sample_rate", "symbol_rate", "length"])
+_HEADER = struct.Struct("<4sHHIIQ")
+_MAGIC = b"X2DC"
+_VERSION = 1
+
+
+def read_header(path):
+    with open(path, 'rb') as file:
+        data = file.read(_HEADER.size)
+    if len(data) < _HEADER.size:
+        raise Exception(f"Truncated packed capture: {path}")
+    magic, version, size, sample_rate, symbol_rate, length = _HEADER.unpack(data)
+    if magic != _MAGIC or version != _VERSION:
+        raise Exception(f"Not a packed capture: {path}")
+    return CaptureHeader(size, sample_rate, symbol_rate, length)
+
+
+def pack_bits(bits):
+    if np is not None:
+        return np.packbits(np.frombuffer(bits, dtype=np.uint8)).tobytes()
+    return BitBuffer.from_bits(bits).tobytes()
+
+
+def unpack_bits(data):
+    if np is not None:
+        return np.unpackbits(np.frombuffer(data, dtype=np.uint8)).tobytes()
+    return bytes(BitBuffer(data).unpack())
+
+
+def pack_capture(path, packed_path, format=RAW, sample_rate=0, symbol_rate=0, chunk_size=1 << 20):
+    # Pack a raw or ASCII bit capture, by chunks: each sample takes a bit
+    # instead of a byte
+    length = 0
+    rest = b""
+    with open(packed_path, 'wb') as file:
+        file.write(_HEADER.pack(_MAGIC, _VERSION, _HEADER.size, sample_rate, symbol_rate, 0))
+        for chunk in CaptureReader(path, format, chunk_size):
+            bits = rest + chunk
+            aligned = len(bits) - len(bits) % 8
+            file.write(pack_bits(bits[:aligned]))
+            rest = bits[aligned:]
+            length += aligned
+        if len(rest) > 0:
+            file.write(pack_bits(rest))
+            length += len(rest)
+        file.seek(0)
+        file.write(_HEADER.pack(_MAGIC, _VERSION, _HEADER.size, sample_rate, symbol_rate, length))
+    return CaptureHeader(_HEADER.size, sample_rate, symbol_rate, length)
+
+
+def unpack_capture(packed_path, path, format=BITS, chunk_size=1 << 20):
+    # Back to a raw capture or to ASCII "0"/"1"
+    with open(path, 'wb') as file:
+        for bits in CaptureReader(packed_path, PACKED, chunk_size):
+            file.write(bits.translate(_BITS_TO_ASCII) if format == BITS else bits)
+
+
+#
+# Frame index
+#
+
+# Sidecar index of a capture: windows of the capture holding decoded frames,
+# as pairs of little endian offsets
+_WINDOW = struct.Struct("<QQ")
+
+
+def index_path(path):
+    return f"{path}.idx"
+
+
+def index_frames(processors, capture, granularity=1 << 15):
+    # Windows of the capture that give an output, along with it. A window
+    # starts after a reset of the first processor, from where a decoding gives
+    # the same output from clean processors, and stops at most granularity
+    # after the data that gave the output: the first processor is fed by
+    # slices, otherwise the silence after a burst would be part of its window.
+    # The following processors are streamed the output of the first one as
+    # live data.
+    first = processors[0]
+    if capture.format != PULSES:
+        seek(processors, capture.start)
+    sync = first.offset
+    for chunk in capture:
+        idx = 0
+        while idx < len(chunk):
+            length, data, status = first.process(chunk[idx:idx + granularity])
+            idx += length
+            if data is not None:
+                out_data = list(stream(processors[1:], [data]))
+                if len(out_data) > 0:
+                    yield (sync, first.offset), out_data
+            if status == Processor.Status.RESET:
+                for p in processors:
+                    p.reset()
+                sync = first.offset
+
+
+def build_index(processors, capture, path=None, granularity=1 << 15):
+    # Decode the whole capture once and write the windows of its frames
+    windows = []
+    for window, _ in index_frames(processors, capture, granularity):
+        if len(windows) > 0 and windows[-1][0] == window[0]:
+            windows[-1] = window
+        else:
+            windows.append(window)
+    write_index(path or index_path(capture.path), windows)
+    return windows
+
+
+def write_index(path, windows):
+    with open(path, 'wb') as file:
+        for window in windows:
+            file.write(_WINDOW.pack(*window))
+
+
+def read_index(path):
+    with open(path, 'rb') as file:
+        return [tuple(window) for window in _WINDOW.iter_unpack(file.read())]
+
+
+def decode_index(processors, path, format=PACKED, windows=None, chunk_size=1 << 20):
+    # Decode only the windows of the index instead of the whole capture
+    if windows is None:
+        windows = read_index(index_path(path))
+    for start, stop in windows:
+        for p in processors:
+            p.reset()
+        yield from decode(processors, CaptureReader(path, format, chunk_size, start, stop))
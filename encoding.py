@@ -1,9 +1,18 @@
+import os
 import sys
+import time
 
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
-from itertools import repeat
+from itertools import islice, repeat
+from collections import OrderedDict, deque, namedtuple
 from collections.abc import Iterable, Sized
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 def _set_or_extend(current, to_add):
     if current is None:
@@ -13,52 +22,574 @@ def _set_or_extend(current, to_add):
     return current
 
 
+def _find(data, value, start=0, stop=None):
+    # Index of a byte value or a pattern in data[start:stop], or -1. A view
+    # is copied by windows of growing size: the cost depends on the distance
+    # to the match, not on the length of the rest of the view.
+    stop = len(data) if stop is None else min(stop, len(data))
+    if isinstance(data, BitBuffer) and isinstance(value, int):
+        try:
+            return data.index(value, start, stop)
+        except ValueError:
+            return -1
+    if isinstance(data, (bytes, bytearray, BitBuffer)):
+        return data.find(value, start, stop)
+    overlap = 0 if isinstance(value, int) else len(value) - 1
+    window = 64
+    while start + overlap < stop:
+        end = min(start + window + overlap, stop)
+        found = bytes(data[start:end]).find(value)
+        if found >= 0:
+            return start + found
+        start = end - overlap
+        window *= 2
+    return -1
+
+
+#
+# Packed bits
+#
+
+_UNPACKED_BYTES = [bytes((b >> (7 - i)) & 0x1 for i in range(8)) for b in range(256)]
+_REVERSED_BYTES = bytes(int(f"{b:08b}"[::-1], 2) for b in range(256))
+_BITS_TO_ASCII = bytes.maketrans(b'\x00\x01', b'01')
+_NOT_BITS = bytes([0, 0] + [1] * 254)
+
+
+class BitBuffer(object):
+    # Bits are stored MSB first, 8 per byte. The unused bits of the last byte
+    # are always 0 so whole bytes can be compared, searched and translated.
+    # The bits start at the bit offset _start of the first byte, the head is
+    # deleted in O(1) and the bits realigned only when whole bytes are needed.
+    SEARCH_WINDOW = 4096
+
+    def __init__(self, data=None, length=None):
+        self._data = bytearray() if data is None else bytearray(data)
+        self._start = 0
+        self._length = len(self._data) * 8 if length is None else length
+        if self._length > len(self._data) * 8:
+            raise Exception(f"Invalid length {self._length} for {len(self._data)} bytes")
+        del self._data[(self._length + 7) >> 3:]
+        if self._length & 0x7:
+            self._data[-1] &= (0xFF << (8 - (self._length & 0x7))) & 0xFF
+
+    @classmethod
+    def from_bits(cls, bits):
+        if isinstance(bits, BitBuffer):
+            return cls(bits.tobytes(), bits._length)
+        bits = bytes(bits)
+        if len(bits) == 0:
+            return cls()
+        padding = -len(bits) % 8
+        value = int((bits + bytes(padding)).translate(_BITS_TO_ASCII), 2)
+        return cls(value.to_bytes((len(bits) + padding) >> 3, 'big'), len(bits))
+
+    @classmethod
+    def from_int(cls, value, length):
+        padding = -length % 8
+        return cls((value << padding).to_bytes((length + padding) >> 3, 'big'), length)
+
+    def to_int(self, start=0, stop=None):
+        stop = self._length if stop is None else stop
+        if stop <= start:
+            return 0
+        start, stop = start + self._start, stop + self._start
+        first, last = start >> 3, (stop + 7) >> 3
+        value = int.from_bytes(self._data[first:last], 'big')
+        return (value >> (last * 8 - stop)) & ((1 << (stop - start)) - 1)
+
+    def tobytes(self):
+        self.compact()
+        return bytes(self._data)
+
+    def compact(self):
+        # Realign the bits on the first byte, at most once per copy of the data
+        if self._start != 0:
+            self._data = BitBuffer.from_int(self.to_int(), self._length)._data
+            self._start = 0
+
+    def unpack(self, start=0, stop=None):
+        stop = self._length if stop is None else min(stop, self._length)
+        if stop <= start:
+            return bytearray()
+        start, stop = start + self._start, stop + self._start
+        first = start >> 3
+        bits = b''.join(map(_UNPACKED_BYTES.__getitem__, self._data[first:(stop + 7) >> 3]))
+        return bytearray(bits[start - first * 8:stop - first * 8])
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        for start in range(0, self._length, self.SEARCH_WINDOW):
+            yield from self.unpack(start, start + self.SEARCH_WINDOW)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self._length)
+            if step != 1:
+                return BitBuffer.from_bits(self.unpack()[key])
+            if stop <= start:
+                return BitBuffer()
+            first = start + self._start
+            if first & 0x7 == 0:
+                return BitBuffer(self._data[first >> 3:(stop + self._start + 7) >> 3], stop - start)
+            return BitBuffer.from_int(self.to_int(start, stop), stop - start)
+        if key < 0:
+            key += self._length
+        if not 0 <= key < self._length:
+            raise IndexError("BitBuffer index out of range")
+        key += self._start
+        return (self._data[key >> 3] >> (7 - (key & 0x7))) & 0x1
+
+    def __eq__(self, other):
+        if isinstance(other, BitBuffer):
+            return self._length == other._length and self.tobytes() == other.tobytes()
+        if isinstance(other, Iterable) and isinstance(other, Sized):
+            return self._length == len(other) and self.unpack() == bytes(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.tobytes()!r}, {self._length})"
+
+    def __delitem__(self, key):
+        if not isinstance(key, slice) or key.step not in (None, 1) or key.indices(self._length)[0] != 0:
+            raise Exception("Only the head of a BitBuffer can be deleted")
+        stop = key.indices(self._length)[1]
+        start = self._start + stop
+        del self._data[:start >> 3]
+        self._start = start & 0x7
+        self._length -= stop
+
+    def append(self, bit):
+        self.extend([bit])
+
+    def extend(self, bits):
+        if bits is self or not isinstance(bits, BitBuffer):
+            bits = BitBuffer.from_bits(bits)
+        bits.compact()
+        used = (self._start + self._length) & 0x7
+        if used == 0:
+            self._data.extend(bits._data)
+        elif len(bits) > 0:
+            length = used + len(bits)
+            value = (self._data.pop() >> (8 - used)) << len(bits) | bits.to_int()
+            self._data.extend((value << (-length % 8)).to_bytes((length + 7) >> 3, 'big'))
+        self._length += len(bits)
+
+    def index(self, value, start=0, stop=None):
+        # Search windows of growing size: runs are usually short
+        stop = self._length if stop is None else min(stop, self._length)
+        window = 64
+        while start < stop:
+            end = min(start + window, stop)
+            bits = self.to_int(start, end)
+            if value == 0:
+                bits ^= (1 << (end - start)) - 1
+            if bits:
+                return end - bits.bit_length()
+            start = end
+            window = min(window * 2, self.SEARCH_WINDOW)
+        raise ValueError(f"{value} is not in BitBuffer")
+
+    def find(self, pattern, start=0, stop=None):
+        # Search unpacked windows overlapping by the pattern length
+        pattern = bytes(pattern)
+        stop = self._length if stop is None else min(stop, self._length)
+        while start + len(pattern) <= stop:
+            end = min(start + self.SEARCH_WINDOW + len(pattern) - 1, stop)
+            found = self.unpack(start, end).find(pattern)
+            if found >= 0:
+                return start + found
+            start = end - len(pattern) + 1
+        return -1
+
+
+def _bits_prefix(in_data, multiple=1):
+    # Pack the longest prefix of 0/1 values, rounded down to a multiple. A
+    # view is searched by windows of growing size: the rest of the view after
+    # an invalid value isn't copied.
+    window = 512 if isinstance(in_data, memoryview) else len(in_data)
+    length = 0
+    while length < len(in_data):
+        found = bytes(in_data[length:length + window]).translate(_NOT_BITS).find(1)
+        if found >= 0:
+            length += found
+            break
+        length += window
+        window *= 2
+    length = min(length, len(in_data))
+    return BitBuffer.from_bits(bytes(in_data[:length - length % multiple]))
+
+
+def _decode_bits_prefix(in_data, table, decoding):
+    # Same as _decode_pulse_pairs() for the pulse pairs of the longest prefix
+    # of 0/1 values of unpacked data, packed by windows of growing size too
+    out_data = BitBuffer()
+    start = 0
+    window = 512
+    while True:
+        pulses = _bits_prefix(in_data[start:start + window], 2)
+        bits, invalid = _decode_pulse_pairs(pulses, table, decoding)
+        out_data.extend(bits)
+        if invalid is not None:
+            return out_data, start // 2 + invalid
+        if len(pulses) < window:
+            return out_data, None
+        start += window
+        window *= 2
+
+
+def _pulse_value(pulse):
+    return pulse[0] << 1 | pulse[1]
+
+
+def _pulse_pairs_decoding(zero_pulses, one_pulses):
+    decoding = {_pulse_value(p): 0 for p in zero_pulses}
+    decoding.update({_pulse_value(p): 1 for p in one_pulses})
+    return decoding
+
+
+def _pulse_pairs_encode_table(zero_pulse, one_pulse):
+    # Byte of bits -> the two bytes of their pulses
+    table = []
+    for b in range(256):
+        value = 0
+        for i in range(8):
+            value = value << 2 | _pulse_value(one_pulse if (b >> (7 - i)) & 0x1 else zero_pulse)
+        table.append(value.to_bytes(2, 'big'))
+    return table
+
+
+def _biphase_mark_encode_table(zero_pulses, one_pulses, flip):
+    # Byte of bits -> the two bytes of their pulses and the flip after them
+    table = []
+    for b in range(256):
+        value = 0
+        f = flip
+        for i in range(8):
+            pulse = (one_pulses if (b >> (7 - i)) & 0x1 else zero_pulses)[1 - f]
+            value = value << 2 | _pulse_value(pulse)
+            f = pulse[1]
+        table.append((value.to_bytes(2, 'big'), f))
+    return table
+
+
+def _pulse_pairs_decode_table(decoding):
+    # Byte of pulses -> hex digit of the 4 decoded bits, "x" if one of them is invalid
+    table = bytearray()
+    for b in range(256):
+        value = 0
+        for i in range(4):
+            pulse = (b >> (6 - 2 * i)) & 0x3
+            if pulse not in decoding:
+                value = None
+                break
+            value = value << 1 | decoding[pulse]
+        table.extend(b'x' if value is None else b'%x' % value)
+    return bytes(table)
+
+
+def _decode_pulse_pairs(in_data, table, decoding):
+    # Decode the complete pulse pairs of a BitBuffer, 4 per table hit.
+    # Return the decoded bits and the index of the first invalid pair if any.
+    # The bytes are translated by windows of growing size, so that an invalid
+    # pair only costs the data before it.
+    count = len(in_data) // 2
+    value = 0
+    idx = 0
+    window = 64
+    while idx < count // 4 * 4:
+        stop = min(idx + window * 4, count // 4 * 4)
+        digits = in_data[idx * 2:stop * 2].tobytes().translate(table)
+        invalid = digits.find(b'x')
+        if invalid >= 0:
+            digits = digits[:invalid]
+        if len(digits) > 0:
+            value = value << (len(digits) * 4) | int(digits, 16)
+        idx += len(digits) * 4
+        if invalid >= 0:
+            break
+        window *= 2
+    while idx < count:
+        pulse = in_data.to_int(idx * 2, idx * 2 + 2)
+        if pulse not in decoding:
+            return BitBuffer.from_int(value, idx), idx
+        value = value << 1 | decoding[pulse]
+        idx += 1
+    return BitBuffer.from_int(value, count), None
+
+
+#
+# Tracing
+#
+
+class Trace(object):
+    # Events of the processors, the offsets and sizes are in the units of
+    # their input data
+    Pulse = namedtuple("Pulse", ["offset", "size", "value"])
+    Symbol = namedtuple("Symbol", ["offset", "value"])
+    Ignored = namedtuple("Ignored", ["offset", "size"])
+    Leading = namedtuple("Leading", ["offset", "size", "value"])
+    Extra = namedtuple("Extra", ["offset", "size"])
+    FrameStart = namedtuple("FrameStart", ["offset", "size"])
+    FrameEnd = namedtuple("FrameEnd", ["offset", "size"])
+    Trailing = namedtuple("Trailing", ["offset", "size"])
+    Rejected = namedtuple("Rejected", ["offset", "reason"])
+    Reset = namedtuple("Reset", ["offset", "size"])
+    Resync = namedtuple("Resync", ["offset", "size"])
+    Error = namedtuple("Error", ["text"])
+    Info = namedtuple("Info", ["text"])
+
+
+def print_sink(processor, event):
+    print(f"{processor} - {event}")
+
+
+class RingBufferSink(object):
+    # Last events of the processors, dumped on demand or on each error
+    def __init__(self, size=4096, dump_on_error=False, file=None):
+        self._events = deque(maxlen=size)
+        self._dump_on_error = dump_on_error
+        self._file = file
+
+    def __call__(self, processor, event):
+        self._events.append((processor, event))
+        if self._dump_on_error and type(event) is Trace.Error:
+            self.dump()
+
+    def events(self):
+        return list(self._events)
+
+    def clear(self):
+        self._events.clear()
+
+    def dump(self, file=None):
+        file = file or self._file or sys.stderr
+        for processor, event in self._events:
+            print(f"{type(processor).__qualname__} - {event}", file=file)
+
+
 #
 # Processors
 #
 
+class Metrics(object):
+    # Counters of a processor, the sizes are in the units of its data: samples,
+    # bits, frames or messages
+    __slots__ = ("chunks", "input_size", "output_size", "resets", "errors", "rejected", "skipped", "wall_time",
+                 "cpu_time")
+
+    def __init__(self):
+        for name in Metrics.__slots__:
+            setattr(self, name, 0)
+
+    def snapshot(self):
+        return {name: getattr(self, name) for name in Metrics.__slots__}
+
+
 class Processor(object):
+    ORIGINS_SIZE = 1024
+
     class Status(Enum):
         CONTINUE = 0xAABBCCDD
         RESET = 0xDEADBEEF
 
-    def __init__(self, throw=True, verbose=False):
+    def __init__(self, throw=True, verbose=False, metrics=False, sink=None, resync=False):
         self._throw = throw
-        self._verbose = verbose
+        # The trace events are only built when a sink is attached
+        self._sink = sink if sink is not None else (print_sink if verbose else None)
+        # In resync mode, the data after a faulty symbol is scanned again
+        # instead of being discarded by the reset
+        self._resync = resync
         self._offset = 0
         self._buffered_data = None
+        self._rescan = None
+        self._metrics = None
+        # The processor feeding this one maps the offsets back to the input of
+        # the first processor, see origin()
+        self._upstream = None
+        self._upstream_base = 0
+        self._emitted = 0
+        self._anchor = None
+        # Input data per output data for the processors that map linearly
+        # their input to their output, e.g. 2 symbols per bit
+        self._input_ratio = None
+        # Whether the output data are samples of the input too, e.g. decimated,
+        # so that their offsets follow the input ones, see seek()
+        self._sample_output = False
+        # Or the origins of the last output data, recorded one by one
+        self._origins = None
+        if metrics:
+            self.enable_metrics()
         self.reset()
 
+    def attach(self, sink):
+        self._sink = sink
+
     def info(self, info):
-        if self._verbose:
-            print(f"{self} - {info}")
+        if self._sink is not None:
+            self._sink(self, Trace.Info(info))
 
     def error(self, error):
+        if self._metrics is not None:
+            self._metrics.errors += 1
+        if self._sink is not None:
+            self._sink(self, Trace.Error(error))
         if self._throw:
             raise Exception(error)
         else:
             print(f"Process error: {error}", file=sys.stderr)
 
+    def reject(self, offset, reason):
+        # Invalid frame dropped by the processor
+        if self._metrics is not None:
+            self._metrics.rejected += 1
+        if self._sink is not None:
+            self._sink(self, Trace.Rejected(offset, reason))
+
+    def skip(self, offset, size):
+        # Input data skipped to get back in sync
+        if self._metrics is not None:
+            self._metrics.skipped += size
+        if self._sink is not None:
+            self._sink(self, Trace.Resync(offset, size))
+
+    def ignore(self, offset, size):
+        # Input data ignored before the start of the data, e.g. the noise
+        # between frames. It is counted with the skipped data: where the data
+        # is ignored or skipped depends on the chunks, not their total.
+        if self._metrics is not None:
+            self._metrics.skipped += size
+        if self._sink is not None:
+            self._sink(self, Trace.Ignored(offset, size))
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    @property
+    def buffered(self):
+        return 0 if self._buffered_data is None else len(self._buffered_data)
+
+    def enable_metrics(self):
+        # The measured process shadows the method of the class, so that
+        # processors without metrics don't pay for them
+        self._metrics = Metrics()
+        self.process = self.measured_process
+
+    def measured_process(self, value):
+        metrics = self._metrics
+        wall_time, cpu_time = time.perf_counter(), time.process_time()
+        result = type(self).process(self, value)
+        metrics.wall_time += time.perf_counter() - wall_time
+        metrics.cpu_time += time.process_time() - cpu_time
+        if result is not None:
+            consumed, out_data, s = result
+            metrics.chunks += 1
+            metrics.input_size += consumed
+            if out_data is not None:
+                metrics.output_size += len(out_data)
+            if s == Processor.Status.RESET:
+                metrics.resets += 1
+        return result
+
     def process(self, value):
         if value is None:
             return None
         if not isinstance(value, Iterable) or not isinstance(value, Sized):
             raise Exception(f"Invalid data type: {type(value)}")
+        if self._anchor is None:
+            # The first output data since the reset starts at this offset
+            self._anchor = (self._emitted, self._offset)
+        buffered = self.buffered
+        owned = self._buffered_data is not None
         in_data = _set_or_extend(self._buffered_data, value)
         consumed, out_data, s = self.data(in_data)
+        if out_data is not None:
+            self._emitted += len(out_data)
+        if s == Processor.Status.RESET:
+            return self.rewind(in_data, buffered, consumed), out_data, s
         self._offset += consumed
-        if s == Processor.Status.CONTINUE:
-            self._buffered_data = in_data[consumed:]
-            consumed = len(value)
-        return consumed, out_data, s
+        if owned:
+            # Consume the head of the buffer in place, O(1) for a bytearray
+            del in_data[:consumed]
+        else:
+            # Copy the remaining data only once, when the buffer starts, and
+            # into a bytearray for the chunks that can't be extended
+            in_data = in_data[consumed:]
+            if isinstance(in_data, (bytes, memoryview)):
+                in_data = bytearray(in_data)
+        self._buffered_data = in_data if len(in_data) > 0 else None
+        return len(value), out_data, s
+
+    def rewind(self, in_data, buffered, consumed):
+        # The data after the faulty symbol is fed again by the caller from its
+        # value, the consumed size returned is relative to it. The rest of the
+        # buffer is discarded by the reset, or kept in resync mode.
+        self._offset += consumed
+        self._buffered_data = None
+        if consumed >= buffered:
+            return consumed - buffered
+        if self._resync:
+            self._rescan = in_data[consumed:buffered]
+        else:
+            self._buffered_data = in_data[consumed:buffered]
+        return 0
+
+    @property
+    def offset(self):
+        return self._offset
+
+    @offset.setter
+    def offset(self, offset):
+        # Offset of the data to come, when it doesn't start the input
+        self._offset = offset
+
+    def set_upstream(self, upstream):
+        # The processor feeding this one, set by stream(). The output offsets
+        # of the upstream processor are numbered from 0, they are related to
+        # the input offsets of this one when the processors are chained.
+        if upstream is not self._upstream:
+            self._upstream = upstream
+            buffered = 0 if self._buffered_data is None else len(self._buffered_data)
+            self._upstream_base = self._offset + buffered - upstream._emitted
+
+    def origin(self, offset):
+        # Offset in the input of the first processor of the data at this offset
+        # in the input of this one, e.g. the sample starting a frame. None when
+        # a processor of the chain doesn't map its output to its input.
+        if self._upstream is None:
+            return offset
+        return self._upstream.output_origin(offset - self._upstream_base)
+
+    def output_origin(self, offset):
+        # Same for an offset in the output of this processor
+        if self._origins is not None:
+            return self._origins.get(offset)
+        if self._input_ratio is None or self._anchor is None or offset < self._anchor[0]:
+            return None
+        emitted, start = self._anchor
+        return self.origin(start + round((offset - emitted) * self._input_ratio))
+
+    def record_origin(self, count, offset):
+        # Origin of the output data following the count ones already output by
+        # the current data() call, from its offset in the input. The last
+        # ORIGINS_SIZE are kept for the following processors.
+        self._origins[self._emitted + count] = self.origin(offset)
+        if len(self._origins) > Processor.ORIGINS_SIZE:
+            self._origins.popitem(last=False)
 
     def data(self, data):
         raise NotImplementedError()
 
     def reset(self):
         if self._buffered_data is not None:
+            if self._sink is not None:
+                self._sink(self, Trace.Reset(self._offset, len(self._buffered_data)))
             self._offset += len(self._buffered_data)
-            self._buffered_data = None
+        self._buffered_data, self._rescan = self._rescan, None
+        self._anchor = None
 
 
 class Bitstream(object):
@@ -66,8 +597,20 @@ class Bitstream(object):
         def __init__(self, be=True, *args, **kwargs):
             super().__init__(*args, **kwargs)
             self._be = be
+            self._input_ratio = 8
+
+        def data_packed(self, in_data):
+            idx = len(in_data) // 8 * 8
+            if idx == 0:
+                return idx, None, Processor.Status.CONTINUE
+            out_data = bytearray(in_data.tobytes()[:idx // 8])
+            if not self._be:
+                out_data = out_data.translate(_REVERSED_BYTES)
+            return idx, out_data, Processor.Status.CONTINUE
 
         def data(self, in_data):
+            if isinstance(in_data, BitBuffer):
+                return self.data_packed(in_data)
             out_data = None
             b = 0
             idx = 0
@@ -82,11 +625,23 @@ class Bitstream(object):
             return idx, out_data, Processor.Status.CONTINUE
 
     class Encoder(Processor):
-        def __init__(self, be=True, *args, **kwargs):
+        def __init__(self, be=True, packed=False, *args, **kwargs):
             super().__init__(*args, **kwargs)
             self._be = be
+            self._packed = packed
+            self._input_ratio = 1 / 8
+            # The bits of a CC1101 capture are its samples
+            self._sample_output = True
+
+        def data_packed(self, in_data):
+            data = bytes(in_data)
+            if not self._be:
+                data = data.translate(_REVERSED_BYTES)
+            return len(in_data), BitBuffer(data), Processor.Status.CONTINUE
 
         def data(self, in_data):
+            if self._packed:
+                return self.data_packed(in_data)
             out_data = None
             idx = 0
             while idx < len(in_data):
@@ -100,16 +655,206 @@ class Bitstream(object):
 
 
 
+class IQ(object):
+    # Interleaved I/Q formats: NumPy type of I and Q, and their zero
+    FORMATS = {
+        "cu8": ("u1", 127.5),
+        "cs8": ("i1", 0.0),
+        "cs16": ("<i2", 0.0),
+        "cf32": ("<f4", 0.0),
+    }
+
+    class Decoder(Processor):
+        # I/Q samples to the 0/1 samples of OOK.Decoder. The power is smoothed
+        # over a few samples, a small part of a symbol (415 samples at 2 MS/s),
+        # and compared to a threshold for each block: the middle of the noise
+        # floor and of the signal level, or ratio times the floor when weaker.
+        # The floor is a low percentile of the blocks, followed from block to
+        # block. The samples switch out of a band around the threshold, of
+        # hysteresis times its distance to the floor: centered, the smoothing
+        # delays both edges the same and keeps the width of the pulses.
+        def __init__(self, format="cu8", smoothing=32, ratio=2.0, hysteresis=0.6, block_size=1 << 14,
+                     percentile=25, decay=0.2, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            if np is None:
+                raise Exception("NumPy is required for I/Q decoding")
+            if format not in IQ.FORMATS:
+                raise Exception(f"Invalid I/Q format: {format}")
+            dtype, zero = IQ.FORMATS[format]
+            self._dtype = np.dtype(dtype)
+            self._input_ratio = self._dtype.itemsize * 2
+            self._sample_output = True
+            self._zero = np.float32(zero)
+            # Square of each value of the 8-bit formats
+            self._squares = None
+            if self._dtype.itemsize == 1:
+                self._squares = (np.arange(256, dtype=np.uint8).view(self._dtype).astype(np.float32) - zero) ** 2
+            self._smoothing = smoothing
+            self._ratio = ratio
+            self._hysteresis = hysteresis
+            self._block_size = block_size
+            self._percentile = percentile
+            self._decay = decay
+            self._tail = None
+            self._floor = None
+            self._signal = None
+            self._quiet = None
+            self._level = None
+            self.reset()
+
+        def reset(self):
+            super().reset()
+            # Powers of the last samples for the smoothing of the next ones
+            self._tail = None
+            self._floor = None
+            self._signal = None
+            # Samples since the last strong one
+            self._quiet = 0
+            self._level = False
+
+        @property
+        def floor(self):
+            return self._floor
+
+        def power(self, in_data, length):
+            if self._squares is not None:
+                squares = self._squares[np.frombuffer(in_data, dtype=np.uint8, count=length)]
+            else:
+                iq = np.frombuffer(in_data, dtype=self._dtype, count=length // self._dtype.itemsize)
+                squares = (iq.astype(np.float32) - self._zero) ** 2
+            return squares[0::2] + squares[1::2]
+
+        def smooth(self, power):
+            if self._tail is None:
+                self._tail = np.zeros(self._smoothing - 1)
+            power = np.concatenate((self._tail, power))
+            self._tail = power[len(power) - self._smoothing + 1:]
+            total = np.cumsum(power)
+            total[self._smoothing:] = total[self._smoothing:] - total[:-self._smoothing]
+            total *= 1 / self._smoothing
+            return total[self._smoothing - 1:]
+
+        def thresholds(self, block):
+            # The smoothed power changes slowly, a part of the block is enough
+            # for the statistics
+            step = max(self._smoothing // 4, 1)
+            block = block[::step]
+            floor = np.percentile(block, self._percentile)
+            # The blocks cut by the end of the data count for their length
+            decay = self._decay * len(block) / self._block_size
+            self._floor = floor if self._floor is None else self._floor + decay * (floor - self._floor)
+            threshold = max(self._floor, np.finfo(np.float32).tiny) * self._ratio
+            # The signal level is only known while transmitting: it is dropped
+            # after a block size without strong samples, whatever the chunks
+            strong = np.flatnonzero(block > threshold)
+            if len(strong) == 0:
+                self._quiet += len(block) * step
+                if self._quiet >= self._block_size:
+                    self._signal = None
+            else:
+                signal = np.median(block[strong])
+                self._signal = signal if self._signal is None else self._signal + decay * (signal - self._signal)
+                self._quiet = (len(block) - 1 - strong[-1]) * step
+            if self._signal is not None:
+                threshold = max(threshold, (self._floor + self._signal) / 2)
+            band = self._hysteresis * (threshold - self._floor)
+            return threshold + band, threshold - band
+
+        def data(self, in_data):
+            length = len(in_data) - len(in_data) % (self._dtype.itemsize * 2)
+            if length == 0:
+                return 0, None, Processor.Status.CONTINUE
+            if not isinstance(in_data, (bytes, bytearray, memoryview)):
+                in_data = bytes(in_data[:length])
+            power = self.smooth(self.power(in_data, length))
+
+            # 1 above the threshold, 0 under its hysteresis, else the previous
+            # level: the index of the last decided sample is carried forward,
+            # the first one is the level carried from the previous data
+            above = np.empty(len(power) + 1, dtype=bool)
+            decided = np.empty(len(power) + 1, dtype=bool)
+            above[0] = decided[0] = self._level
+            decided[0] = True
+            for start in range(0, len(power), self._block_size):
+                block = power[start:start + self._block_size]
+                high, low = self.thresholds(block)
+                stop = start + 1 + len(block)
+                np.greater(block, high, out=above[start + 1:stop])
+                np.less(block, low, out=decided[start + 1:stop])
+                decided[start + 1:stop] |= above[start + 1:stop]
+            last = np.arange(len(above), dtype=np.int32)
+            last[~decided] = 0
+            np.maximum.accumulate(last, out=last)
+            samples = above[last[1:]]
+            self._level = bool(samples[-1])
+            return length, bytearray(samples.view(np.uint8).tobytes()), Processor.Status.CONTINUE
+
+
+class Decimation(object):
+    class Decoder(Processor):
+        # Each block of factor samples gives one sample, 1 when at least
+        # threshold of them are 1 (the majority by default). The run length
+        # decoding that follows has factor times less samples to go through,
+        # but its pulse widths are rounded to factor samples: keep about ten
+        # samples per symbol for the OOK error margin.
+        def __init__(self, factor, threshold=None, vectorized=False, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            if vectorized and np is None:
+                raise Exception("NumPy is required for vectorized decimation")
+            self._factor = factor
+            self._input_ratio = factor
+            self._sample_output = True
+            self._threshold = factor // 2 + 1 if threshold is None else threshold
+            self._vectorized = vectorized
+            # Count of "1" of a block -> its sample
+            self._table = bytes(1 if count >= self._threshold else 0 for count in range(factor + 1))
+
+        def data_vectorized(self, in_data, length):
+            if isinstance(in_data, (bytes, bytearray, memoryview)):
+                samples = np.frombuffer(in_data, dtype=np.uint8, count=length)
+            else:
+                samples = np.asarray(in_data[:length], dtype=np.uint8)
+            counts = samples.reshape(-1, self._factor).sum(axis=1, dtype=np.uint32)
+            return bytearray((counts >= self._threshold).astype(np.uint8).tobytes())
+
+        def data(self, in_data):
+            length = len(in_data) - len(in_data) % self._factor
+            if length == 0:
+                return 0, None, Processor.Status.CONTINUE
+            if self._vectorized:
+                out_data = self.data_vectorized(in_data, length)
+            else:
+                factor = self._factor
+                samples = in_data if isinstance(in_data, (bytes, bytearray)) else bytes(in_data[:length])
+                out_data = bytearray(map(self._table.__getitem__,
+                                         map(samples.count, repeat(1), range(0, length, factor),
+                                             range(factor, length + 1, factor))))
+            return length, out_data, Processor.Status.CONTINUE
+
+
 class OOK(object):
     class Decoder(Processor):
         UNDEFINED = 2
+        BLOCK_SIZE = 1 << 16
 
-        def __init__(self, sample_rate, symbol_rate, error=0.3, *args, **kwargs):
+        def __init__(self, sample_rate, symbol_rate, error=0.3, vectorized=False, packed=False, decimation=1, *args,
+                     **kwargs):
             super().__init__(*args, **kwargs)
-            self._threshold = sample_rate / symbol_rate
+            if vectorized and np is None:
+                raise Exception("NumPy is required for vectorized OOK decoding")
+            # The samples are decimated by a previous Decimation stage, the
+            # offsets and sizes are still reported in the original samples
+            self._decimation = decimation
+            self._threshold = sample_rate / decimation / symbol_rate
+            self._input_ratio = self._threshold
             self._error_threshold = self._threshold * error
+            self._vectorized = vectorized
+            self._packed = packed
             self._bit = None
             self._count = None
+            # Runs of the vectorized decoding after an invalid pulse, see
+            # decode_runs(). They are kept across the reset that follows.
+            self._runs = None
             self.reset()
 
         def reset(self):
@@ -123,7 +868,108 @@ class OOK(object):
                     return i
             return None
 
+        def find_pulse_widths(self, counts):
+            widths = np.zeros(len(counts), dtype=np.uint8)
+            for i in range(2, 0, -1):
+                valid = ((self._threshold - self._error_threshold) * i < counts) & (
+                        counts < (self._threshold + self._error_threshold) * i)
+                widths[valid] = i
+            return widths
+
+        def data_vectorized(self, in_data):
+            if isinstance(in_data, (bytes, bytearray, memoryview)):
+                samples = np.frombuffer(in_data, dtype=np.uint8)
+            else:
+                samples = np.asarray(in_data, dtype=np.uint8)
+            out_data = None
+            idx = 0
+            s = Processor.Status.CONTINUE
+            while idx < len(samples) and s == Processor.Status.CONTINUE:
+                # Bound the work done before a possible error
+                length, data, s = self.decode_runs(samples[idx:idx + self.BLOCK_SIZE], idx)
+                out_data = _set_or_extend(out_data, data)
+                idx += length
+            return idx, out_data, s
+
+        def classify_runs(self, samples):
+            # Edges are the sample indexes starting a new run, the first run
+            # continues the one carried from the previous call
+            idx = 0
+            if self._bit == self.UNDEFINED:
+                self._bit = int(samples[0])
+                self._count = 1
+                idx += 1
+
+            edges = np.flatnonzero(np.diff(samples[idx:], prepend=np.uint8(self._bit))) + idx
+            if len(edges) == 0:
+                self._count += len(samples) - idx
+                return None
+            counts = np.empty(len(edges), dtype=np.int64)
+            counts[0] = self._count + edges[0] - idx
+            counts[1:] = np.diff(edges)
+            levels = np.empty(len(edges), dtype=np.uint8)
+            levels[0] = self._bit
+            levels[1:] = samples[edges[:-1]]
+            widths = self.find_pulse_widths(counts)
+            return len(samples), edges, counts, levels, widths, np.flatnonzero(widths == 0)
+
+        def decode_runs(self, samples, base):
+            # Same semantic as data() but working on whole runs at once. The
+            # runs after an invalid pulse are the ones of a decoding restarted
+            # there: they are kept for the next call, that starts there after
+            # the reset, so that each block is classified once, even on noise.
+            runs = self._runs
+            self._runs = None
+            if runs is not None and self._bit == self.UNDEFINED:
+                start, length, edges, counts, levels, widths, invalids, first = runs
+                # Index of the first sample in the classified block
+                shift = int(edges[first - 1])
+                if start + shift != self._offset + base or length - shift > len(samples):
+                    runs = None
+            if runs is None:
+                runs = self.classify_runs(samples)
+                if runs is None:
+                    return len(samples), None, Processor.Status.CONTINUE
+                length, edges, counts, levels, widths, invalids = runs
+                start, shift, first = self._offset + base, 0, 0
+            elif first == len(edges):
+                # The last run of the block continues
+                self._bit = int(samples[0])
+                self._count = length - shift
+                return length - shift, None, Processor.Status.CONTINUE
+
+            k = np.searchsorted(invalids, first)
+            valid = len(edges) if k == len(invalids) else int(invalids[k])
+            if self._sink is not None:
+                for d, end, count in zip(levels[first:valid], edges[first:valid], counts[first:valid]):
+                    self._sink(self, Trace.Pulse((start + int(end - count)) * self._decimation,
+                                                 int(count) * self._decimation, int(d)))
+            out_data = None
+            if valid > first:
+                out_data = bytearray(np.repeat(levels[first:valid], widths[first:valid]).tobytes())
+
+            if valid < len(edges):
+                idx = int(edges[valid]) - shift
+                d = int(levels[valid])
+                self._bit = self.UNDEFINED
+                self._count = int(counts[valid])
+                self._runs = start, length, edges, counts, levels, widths, invalids, valid + 1
+                self.error(f"Invalid pulse \"{d}\" " +
+                           f"at offset {(self._offset + base + idx - self._count) * self._decimation} " +
+                           f"of size {self._count * self._decimation}")
+                return idx, out_data, Processor.Status.RESET
+
+            self._bit = int(samples[edges[-1] - shift])
+            self._count = length - int(edges[-1])
+            return length - shift, out_data, Processor.Status.CONTINUE
+
         def data(self, in_data):
+            idx, out_data, s = self.data_vectorized(in_data) if self._vectorized else self.data_samples(in_data)
+            if self._packed and out_data is not None:
+                out_data = BitBuffer.from_bits(out_data)
+            return idx, out_data, s
+
+        def data_samples(self, in_data):
             out_data = None
             idx = 0
             s = Processor.Status.CONTINUE
@@ -134,8 +980,8 @@ class OOK(object):
                     self._count = 1
                     idx += 1
                 else:
-                    try:
-                        end = in_data.index(1 - self._bit, idx)
+                    end = _find(in_data, 1 - self._bit, idx)
+                    if end >= 0:
                         self._count += (end - idx)
                         idx += (end - idx)
                         d = self._bit
@@ -145,14 +991,15 @@ class OOK(object):
 
                         if width is None:
                             self.error(f"Invalid pulse \"{d}\" " +
-                                       f"at offset {self._offset + idx - self._count} " +
-                                       f"of size {self._count}")
+                                       f"at offset {(self._offset + idx - self._count) * self._decimation} " +
+                                       f"of size {self._count * self._decimation}")
                             s = Processor.Status.RESET
                         else:
-                            self.info(
-                                f"Pulse \"{d}\" at offset {self._offset + idx - self._count} of size {self._count}")
+                            if self._sink is not None:
+                                self._sink(self, Trace.Pulse((self._offset + idx - self._count) * self._decimation,
+                                                             self._count * self._decimation, d))
                             out_data = _set_or_extend(out_data, bytearray(repeat(d, width)))
-                    except ValueError:
+                    else:
                         end = len(in_data)
                         self._count += (end - idx)
                         idx += (end - idx)
@@ -162,14 +1009,22 @@ class OOK(object):
         def __init__(self, sample_rate, symbol_rate, *args, **kwargs):
             super().__init__(*args, **kwargs)
             self._threshold = sample_rate / symbol_rate
+            self._position = 0.0
             self.reset()
 
+        def reset(self):
+            super().reset()
+            self._position = 0.0
+
         def data(self, in_data):
             out_data = None
             idx = 0
             while idx < len(in_data):
                 d = in_data[idx]
-                out_data = _set_or_extend(out_data, bytearray(repeat(d, self._threshold)))
+                # A symbol lasts a fractional number of samples
+                count = round(self._position + self._threshold) - round(self._position)
+                self._position += self._threshold
+                out_data = _set_or_extend(out_data, bytearray(repeat(d, count)))
                 idx += 1
             return idx, out_data, Processor.Status.CONTINUE
 
@@ -181,11 +1036,15 @@ class Manchester(object):
     #
     zero_pulse = bytes([0, 1])
     one_pulse = bytes([1, 0])
+    decoding = _pulse_pairs_decoding([zero_pulse], [one_pulse])
+    encode_table = _pulse_pairs_encode_table(zero_pulse, one_pulse)
+    decode_table = _pulse_pairs_decode_table(decoding)
 
     class Encoder(Processor):
         def __init__(self, initial, *args, **kwargs):
             super().__init__(*args, **kwargs)
             self._initial = initial or bytearray()
+            self._input_ratio = 1 / 2
             self._initialized = None
             self.reset()
 
@@ -193,13 +1052,31 @@ class Manchester(object):
             super().reset()
             self._initialized = False
 
+        @staticmethod
+        def encode(bits):
+            pulses = b''.join(map(Manchester.encode_table.__getitem__, bits.tobytes()))
+            return BitBuffer(pulses, len(bits) * 2)
+
+        def data_packed(self, in_data):
+            out_data = None
+            if not self._initialized:
+                self._initialized = True
+                out_data = BitBuffer.from_bits(self._initial)
+            out_data = _set_or_extend(out_data, self.encode(in_data))
+            return len(in_data), out_data, Processor.Status.CONTINUE
+
         def data(self, in_data):
+            if isinstance(in_data, BitBuffer):
+                return self.data_packed(in_data)
             out_data = None
             if not self._initialized:
                 self._initialized = True
-                out_data = self._initial
+                out_data = bytearray(self._initial)
             s = Processor.Status.CONTINUE
-            idx = 0
+            bits = _bits_prefix(in_data)
+            if len(bits) > 0:
+                out_data = _set_or_extend(out_data, self.encode(bits).unpack())
+            idx = len(bits)
             while idx < len(in_data):
                 d = in_data[idx]
                 if d == 0:
@@ -215,12 +1092,38 @@ class Manchester(object):
     class Decoder(Processor):
         def __init__(self, *args, **kwargs):
             super().__init__(*args, **kwargs)
+            # A pair of pulses per bit
+            self._input_ratio = 2
             self.reset()
 
+        def skip_invalid(self, idx):
+            # Each bit has a transition in its middle, a pair without one is
+            # either noise or straddles two bits: in resync mode, only its first
+            # symbol is skipped so that the second one can start the next pair
+            if self._resync:
+                self.skip(self._offset + idx, 1)
+                return idx + 1
+            return idx + 2
+
+        def data_packed(self, in_data):
+            out_data, invalid = _decode_pulse_pairs(in_data, Manchester.decode_table, Manchester.decoding)
+            if invalid is not None:
+                idx = invalid * 2
+                self.error(f"Invalid value \"{in_data.unpack(idx, idx + 2)}\" at offset {self._offset + idx}")
+                return self.skip_invalid(idx), out_data or None, Processor.Status.RESET
+            return len(out_data) * 2, out_data or None, Processor.Status.CONTINUE
+
         def data(self, in_data):
-            out_data = None
+            if isinstance(in_data, BitBuffer):
+                return self.data_packed(in_data)
+            bits, invalid = _decode_bits_prefix(in_data, Manchester.decode_table, Manchester.decoding)
+            out_data = bits.unpack() if len(bits) > 0 else None
+            if invalid is not None:
+                idx = invalid * 2
+                self.error(f"Invalid value \"{in_data[idx:idx + 2]}\" at offset {self._offset + idx}")
+                return self.skip_invalid(idx), out_data, Processor.Status.RESET
             s = Processor.Status.CONTINUE
-            idx = 0
+            idx = len(bits) * 2
             while idx + 2 <= len(in_data) and s == Processor.Status.CONTINUE:
                 part = in_data[idx:idx + 2]
                 if part == Manchester.zero_pulse:
@@ -229,7 +1132,7 @@ class Manchester(object):
                     out_data = _set_or_extend(out_data, bytearray([1]))
                 else:
                     self.error(f"Invalid value \"{part}\" at offset {self._offset + idx}")
-                    s = Processor.Status.RESET
+                    return self.skip_invalid(idx), out_data, Processor.Status.RESET
                 idx += 2
             return idx, out_data, s
 
@@ -241,6 +1144,11 @@ class BiphaseMark(object):
     #
     zero_pulses = [bytes([0, 0]), bytes([1, 1])]
     one_pulses = [bytes([0, 1]), bytes([1, 0])]
+    decoding = _pulse_pairs_decoding(zero_pulses, one_pulses)
+    # Indexed by the flip before the byte
+    encode_tables = [_biphase_mark_encode_table(zero_pulses, one_pulses, 0),
+                     _biphase_mark_encode_table(zero_pulses, one_pulses, 1)]
+    decode_table = _pulse_pairs_decode_table(decoding)
 
     class Encoder(Processor):
         def __init__(self, *args, **kwargs):
@@ -252,9 +1160,29 @@ class BiphaseMark(object):
             super().reset()
             self._flip = 1
 
+        def encode(self, bits):
+            # 8 bits per table hit, the flip is carried from one byte to the next
+            pulses = bytearray()
+            full = len(bits) // 8
+            for b in bits.tobytes()[:full]:
+                word, self._flip = BiphaseMark.encode_tables[self._flip][b]
+                pulses.extend(word)
+            out_data = BitBuffer(pulses)
+            for idx in range(full * 8, len(bits)):
+                pulse = (BiphaseMark.one_pulses if bits[idx] else BiphaseMark.zero_pulses)[1 - self._flip]
+                out_data.extend(pulse)
+                self._flip = pulse[1]
+            return out_data
+
+        def data_packed(self, in_data):
+            return len(in_data), self.encode(in_data), Processor.Status.CONTINUE
+
         def data(self, in_data):
-            out_data = None
-            idx = 0
+            if isinstance(in_data, BitBuffer):
+                return self.data_packed(in_data)
+            bits = _bits_prefix(in_data)
+            out_data = self.encode(bits).unpack() if len(bits) > 0 else None
+            idx = len(bits)
             s = Processor.Status.CONTINUE
             while idx < len(in_data) and s == Processor.Status.CONTINUE:
                 d = in_data[idx]
@@ -273,21 +1201,92 @@ class BiphaseMark(object):
     class Decoder(Processor):
         def __init__(self, *args, **kwargs):
             super().__init__(*args, **kwargs)
+            # A pair of pulses per bit
+            self._input_ratio = 2
+            self._last = None
             self.reset()
 
-        def data(self, in_data):
-            out_data = None
-            idx = 0
+        def reset(self):
+            super().reset()
+            # Last symbol consumed, to check the transition before the next one
+            self._last = None
+
+        def decode(self, bits, base=0):
+            out_data, _ = _decode_pulse_pairs(bits, BiphaseMark.decode_table, BiphaseMark.decoding)
+            if self._sink is not None:
+                for idx in range(len(out_data)):
+                    self._sink(self, Trace.Symbol(self._offset + base + idx * 2, out_data[idx]))
+            return out_data
+
+        @staticmethod
+        def find_misalignment(data, start=0, last=None):
+            # Index of the first pair from start that doesn't begin with a
+            # transition, None if they all do. last is the symbol before data.
+            if start == 0:
+                if len(data) > 0 and last is not None and data[0] == last:
+                    return 0
+                start = 2
+            # Search windows of growing size: the cost of a misalignment is
+            # local, the data after it is searched again by the next call
+            window = 64
+            while start < len(data):
+                stop = min(start + window, len(data))
+                if isinstance(data, BitBuffer):
+                    symbols = bytes(data.unpack(start - 1, stop))
+                else:
+                    symbols = bytes(data[start - 1:stop])
+                first = symbols[1::2]
+                transitions = int.from_bytes(symbols[:len(symbols) - 1:2], 'big') ^ int.from_bytes(first, 'big')
+                found = transitions.to_bytes(len(first), 'big').find(0)
+                if found >= 0:
+                    return start + found * 2
+                start = stop
+                window *= 2
+            return None
+
+        def data_packed(self, in_data, base=0):
+            out_data = self.decode(in_data, base)
+            return len(out_data) * 2, out_data or None, Processor.Status.CONTINUE
+
+        def data_aligned(self, in_data, base=0):
+            if isinstance(in_data, BitBuffer):
+                return self.data_packed(in_data, base)
+            bits = self.decode(_bits_prefix(in_data, 2), base)
+            out_data = bits.unpack() if len(bits) > 0 else None
+            idx = len(bits) * 2
             while idx + 2 <= len(in_data):
                 chunk = in_data[idx:idx + 2]
-                if chunk in BiphaseMark.zero_pulses:
-                    out_data = _set_or_extend(out_data, bytearray([0]))
-                elif chunk in BiphaseMark.one_pulses:
-                    out_data = _set_or_extend(out_data, bytearray([1]))
-                self.info(f"Detect \"{out_data[-1]}\" at offset {self._offset + idx}")
+                if chunk in BiphaseMark.zero_pulses or chunk in BiphaseMark.one_pulses:
+                    bit = 0 if chunk in BiphaseMark.zero_pulses else 1
+                    out_data = _set_or_extend(out_data, bytearray([bit]))
+                    if self._sink is not None:
+                        self._sink(self, Trace.Symbol(self._offset + base + idx, bit))
+                elif self._sink is not None:
+                    # The invalid pairs are dropped
+                    self._sink(self, Trace.Error(f"Invalid value \"{chunk}\" at offset {self._offset + base + idx}"))
                 idx += 2
             return idx, out_data, Processor.Status.CONTINUE
 
+        def data(self, in_data):
+            if not self._resync:
+                return self.data_aligned(in_data)
+            # Each bit starts with a transition, a pair without one straddles
+            # two bits: its first symbol is skipped to get back in sync
+            out_data = None
+            idx = 0
+            while True:
+                stop = self.find_misalignment(in_data, idx, self._last)
+                consumed, bits, _ = self.data_aligned(in_data[idx:stop], idx)
+                out_data = _set_or_extend(out_data, bits)
+                idx += consumed
+                if stop is None:
+                    break
+                self.skip(self._offset + stop, 1)
+                idx = stop + 1
+            if idx > 0:
+                self._last = in_data[idx - 1]
+            return idx, out_data, Processor.Status.CONTINUE
+
 
 class X2D(object):
     MIN_LEADING_ZEROS = 7
@@ -297,13 +1296,16 @@ class X2D(object):
     TRAILING_LENGTH = 7
     EXTRA_0_LENGTH = 1
     MAX_BIT_LENGTH = 16 * 8
+    # With the "0" inserted after each 5 successive "1"
+    MAX_STUFFED_LENGTH = MAX_BIT_LENGTH + MAX_BIT_LENGTH // MAX_SUCCESSIVE_ONES
 
     class Encoder(Processor):
-        def __init__(self, preamble_0_count=9, preamble_1_count=6, separator=None, *args, **kwargs):
+        def __init__(self, preamble_0_count=9, preamble_1_count=6, separator=None, packed=False, *args, **kwargs):
             super().__init__(*args, **kwargs)
             self._preamble_0_count = preamble_0_count
             self._preamble_1_count = preamble_1_count
             self._separator = separator or [1, 1, 1, 1, 1, 1, 0]
+            self._packed = packed
             self._is_initialized = None
             self.reset()
 
@@ -316,14 +1318,13 @@ class X2D(object):
             count = 0
             new_data = bytearray()
             for i in data:
+                new_data.append(i)
                 if i == 1:
+                    count += 1
                     if count == X2D.MAX_SUCCESSIVE_ONES:
                         new_data.append(0)
                         count = 0
-                    new_data.append(i)
-                    count += 1
                 else:
-                    new_data.append(i)
                     count = 0
             return new_data
 
@@ -347,6 +1348,8 @@ class X2D(object):
                 out_data = _set_or_extend(out_data, X2D.END_OF_FRAME)
                 out_data = _set_or_extend(out_data, self._separator)
                 idx += 1
+            if self._packed and out_data is not None:
+                out_data = BitBuffer.from_bits(out_data)
             return idx, out_data, s
 
     class Decoder(Processor):
@@ -360,11 +1363,14 @@ class X2D(object):
         def __init__(self, *args, **kwargs):
             super().__init__(*args, **kwargs)
             self._state = None
+            self._known = None
+            self._origins = OrderedDict()
             self.reset()
 
         def reset(self):
             super().reset()
             self._state = self.State.INIT
+            self._known = 0
 
         def strip_0_after_successive_1(self, data):
             count = 0
@@ -382,55 +1388,88 @@ class X2D(object):
             return new_data
 
         @staticmethod
-        def count_leading(data):
-            d = None
-            offset = 0
-            while offset < len(data):
-                if d is None:
-                    d = data[offset]
-                if d is not None and data[offset] != d:
-                    return d, offset, 0
-                offset += 1
-            return d, 0, max(offset - 1, 0)
+        def count_leading(data, start=0, known=0):
+            # The known bits after start have already been checked by a previous call
+            if start >= len(data):
+                return None, 0, 0
+            d = data[start]
+            found = _find(data, 1 - d, start + max(known, 1))
+            if found < 0:
+                return d, 0, len(data) - start - 1
+            return d, found - start, 0
 
         @staticmethod
-        def find_end_frame(data, pattern):
-            n = len(data)
-            m = len(pattern)
-            for i in range(n - m + 1):
-                found = True
-                for j in range(m):
-                    if data[i + j] != pattern[j]:
-                        found = False
-                        break
-                if found:
-                    return i
-            return None
+        def find_leading_zeros(data, start=0):
+            # Start of the first run that may hold the leading "0", all the runs
+            # before can be ignored at once
+            found = _find(data, bytes(X2D.MIN_LEADING_ZEROS), start)
+            if found >= 0:
+                return found
+            # Keep the trailing "0" as the run may continue in the next data
+            found = len(data)
+            while found > start and data[found - 1] == 0:
+                found -= 1
+            return found
+
+        @staticmethod
+        def find_end_frame(data, pattern, start=0, known=0, stop=None):
+            # The known bits after start have already been searched by a previous call
+            found = _find(data, bytes(pattern), start + max(known - len(pattern) + 1, 0), stop)
+            return None if found < 0 else found - start
 
         def data(self, in_data):
             out_data = None
             idx = 0
+            # Index of the next end of frame in resync mode, searched again
+            # only once passed
+            end_frame = -1
             s = Processor.Status.CONTINUE
             while s == Processor.Status.CONTINUE:
                 if self._state == self.State.INIT:
-                    v, count, _ = self.count_leading(in_data[idx:])
+                    start = self.find_leading_zeros(in_data, idx)
+                    if self._resync:
+                        if end_frame is not None and end_frame < idx:
+                            end_frame = self.find_end_frame(in_data, X2D.END_OF_FRAME, idx)
+                            end_frame = None if end_frame is None else idx + end_frame
+                        if end_frame is None:
+                            # Keep the start of an end of frame split with the next data
+                            start = min(start, max(idx, len(in_data) - len(X2D.END_OF_FRAME) + 1))
+                        elif end_frame < start:
+                            # The frames of a burst only have one preamble: after
+                            # a reset, the decoding resumes at the next frame
+                            end = end_frame + len(X2D.END_OF_FRAME)
+                            self.ignore(self._offset + idx, end - idx)
+                            idx = end
+                            self._known = 0
+                            self._state = self.State.TRAILING
+                            continue
+                    if start > idx:
+                        self.ignore(self._offset + idx, start - idx)
+                        idx = start
+                        self._known = 0
+                    v, count, _ = self.count_leading(in_data, idx, self._known)
                     if count <= 0:
                         # Not enough data
+                        self._known = len(in_data) - idx
                         break
+                    self._known = 0
 
                     if count >= X2D.MIN_LEADING_ZEROS and v == 0:
-                        self.info(f"Leading \"0\" at offset {self._offset + idx} of size {count}")
+                        if self._sink is not None:
+                            self._sink(self, Trace.Leading(self._offset + idx, count, 0))
                         idx += count
                         self._state = self.State.LEAD_1
                     else:
-                        self.info(f"Ignoring data at offset {self._offset + idx} of size {count}")
+                        self.ignore(self._offset + idx, count)
                         idx += count
                         self._state = self.State.INIT
                 elif self._state == self.State.LEAD_1:
-                    v, count, _ = self.count_leading(in_data[idx:])
+                    v, count, _ = self.count_leading(in_data, idx, self._known)
                     if count <= 0:
                         # Not enough data
+                        self._known = len(in_data) - idx
                         break
+                    self._known = 0
 
                     if count < X2D.MIN_LEADING_ONES or v != 1:
                         self.error(f"Invalid lead 1 size: {count}")
@@ -439,7 +1478,8 @@ class X2D(object):
                         break
 
                     # Update state
-                    self.info(f"Leading \"1\" at offset {self._offset + idx} of size {count}")
+                    if self._sink is not None:
+                        self._sink(self, Trace.Leading(self._offset + idx, count, 1))
                     idx += count
                     self._state = self.State.EXTRA_0
                 elif self._state == self.State.EXTRA_0:
@@ -448,35 +1488,44 @@ class X2D(object):
                         break
 
                     # Update state
-                    self.info(f"Extra 0 at offset {self._offset + idx}")
+                    if self._sink is not None:
+                        self._sink(self, Trace.Extra(self._offset + idx, X2D.EXTRA_0_LENGTH))
                     idx += X2D.EXTRA_0_LENGTH
                     self._state = self.State.DATA
                 elif self._state == self.State.DATA:
-                    end = self.find_end_frame(in_data[idx:], X2D.END_OF_FRAME)
+                    # A frame longer than the stuffed maximum is rejected, even
+                    # when its end is in the data
+                    end = self.find_end_frame(in_data, X2D.END_OF_FRAME, idx, self._known,
+                                              idx + X2D.MAX_STUFFED_LENGTH + len(X2D.END_OF_FRAME))
                     if end is None:
                         # Not enough data or frame too long?
-                        if idx + X2D.MAX_BIT_LENGTH <= len(in_data):
-                            self.info(f"Missing end of frame data after offset {self._offset + idx}")
+                        if idx + X2D.MAX_STUFFED_LENGTH + len(X2D.END_OF_FRAME) <= len(in_data):
+                            self.reject(self._offset + idx, "missing end of frame")
                             s = Processor.Status.RESET
                             self._state = self.State.INIT
+                            self._known = 0
+                        else:
+                            self._known = len(in_data) - idx
                         break
+                    self._known = 0
 
                     # Extract data
                     part = in_data[idx:idx + end]
                     frame_bitstream = self.strip_0_after_successive_1(part)
                     length, data, f = Bitstream.Decoder(False).process(frame_bitstream)
                     if length != len(frame_bitstream) or f != Processor.Status.CONTINUE:
-                        self.info(f"Invalid data at offset {self._offset + idx}")
+                        self.reject(self._offset + idx, "invalid data")
                         s = Processor.Status.RESET
                         self._state = self.State.INIT
                         break
+                    self.record_origin(0 if out_data is None else len(out_data), self._offset + idx)
                     out_data = _set_or_extend(out_data, [data])
 
                     # Update state
-                    self.info(f"Data offset {self._offset + idx} of size {end}")
-                    idx += end
-                    self.info(f"End of frame offset {self._offset + idx} of size {len(X2D.END_OF_FRAME)}")
-                    idx += len(X2D.END_OF_FRAME)
+                    if self._sink is not None:
+                        self._sink(self, Trace.FrameStart(self._offset + idx, end))
+                        self._sink(self, Trace.FrameEnd(self._offset + idx + end, len(X2D.END_OF_FRAME)))
+                    idx += end + len(X2D.END_OF_FRAME)
                     self._state = self.State.TRAILING
                 elif self._state == self.State.TRAILING:
                     if idx + X2D.TRAILING_LENGTH > len(in_data):
@@ -484,21 +1533,85 @@ class X2D(object):
                         break
 
                     # Update state
-                    self.info(f"Trailing at offset {self._offset + idx} of size {X2D.TRAILING_LENGTH}")
+                    if self._sink is not None:
+                        self._sink(self, Trace.Trailing(self._offset + idx, X2D.TRAILING_LENGTH))
                     idx += X2D.TRAILING_LENGTH
                     self._state = self.State.DATA
             return idx, out_data, s
 
 
 class X2DMessage(object):
+    CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "evictions", "size", "max_size"])
+
     class Decoder(Processor):
+        def __init__(self, cache_size=0, check=False, slotted=False, lazy=False, accept=None, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            # Frames with an invalid length or checksum are dropped before parsing
+            self._check = check
+            # Immutable X2D.Message tuples instead of Containers, or
+            # X2D.LazyMessage views whose payload is parsed on access
+            self._slotted = slotted
+            self._lazy = lazy
+            # Predicate on the frames, e.g. an X2D.MessageFilter, the other
+            # frames are dropped before any parsing
+            self._accept = accept
+            self._dropped = 0
+            self._filtered = 0
+            # Repeated frames are parsed once, the cached messages are frozen
+            self._cache_size = cache_size
+            self._cache = OrderedDict()
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+            self._origins = OrderedDict()
+
+        def cache_info(self):
+            return X2DMessage.CacheInfo(self._hits, self._misses, self._evictions, len(self._cache),
+                                        self._cache_size)
+
+        def parse(self, m):
+            from X2D import parse_x2d_message, freeze_x2d_message
+            if self._cache_size <= 0:
+                return parse_x2d_message(m, slotted=self._slotted, lazy=self._lazy)
+            key = bytes(m)
+            msg = self._cache.get(key)
+            if msg is not None:
+                self._hits += 1
+                self._cache.move_to_end(key)
+                return msg
+            self._misses += 1
+            msg = freeze_x2d_message(parse_x2d_message(key, slotted=self._slotted, lazy=self._lazy))
+            self._cache[key] = msg
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+                self._evictions += 1
+            return msg
+
+        @property
+        def dropped(self):
+            return self._dropped
+
+        @property
+        def filtered(self):
+            return self._filtered
+
         def data(self, in_data):
-            from X2D import parse_x2d_message
+            from X2D import check_x2d_frames
+            valids = check_x2d_frames(in_data) if self._check else None
             out_data = []
             idx = 0
             while idx < len(in_data):
                 m = in_data[idx]
-                out_data.append(parse_x2d_message(m))
+                if valids is not None and not valids[idx]:
+                    self._dropped += 1
+                    self.reject(self._offset + idx, "invalid length or checksum")
+                elif self._accept is not None and not self._accept(m):
+                    self._filtered += 1
+                    if self._sink is not None:
+                        self._sink(self, Trace.Ignored(self._offset + idx, 1))
+                else:
+                    self.record_origin(len(out_data), self._offset + idx)
+                    out_data.append(self.parse(m))
                 idx += 1
             return idx, out_data, Processor.Status.CONTINUE
 
@@ -514,23 +1627,245 @@ class X2DMessage(object):
             return idx, out_data, Processor.Status.CONTINUE
 
 
+class Retransmission(object):
+    class Event(namedtuple("Event", ["offset", "message", "count"], defaults=[1])):
+        # Immutable, a retransmission is emitted as a new event of the same offset
+        __slots__ = ()
+
+        def __repr__(self):
+            return f"Retransmission.Event(offset={self.offset}, count={self.count}, message={self.message!r})"
+
+        def __str__(self):
+            return f"Offset {self.offset}, {self.count} time(s):\n{self.message}"
+
+    class Decoder(Processor):
+        # Collapse the identical messages of a burst into one event, emitted
+        # with the first copy. Each following copy emits an update, an event
+        # of the same offset with the new count: the consumers that act once
+        # per burst only keep the events with a count of 1.
+        # A message is at the offset of its frame in the input of the first
+        # processor, e.g. in samples for the window, whatever the chunks. A
+        # chain that doesn't map its output to its samples needs a clock, e.g.
+        # clock=time.monotonic for a live receiver and a window in seconds.
+        def __init__(self, window, clock=None, max_size=256, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._window = window
+            self._clock = clock
+            self._max_size = max_size
+            # Last events by last seen time, kept across resets since a burst
+            # can be interrupted by noise
+            self._events = OrderedDict()
+
+        def position(self, offset):
+            if self._clock is not None:
+                return self._clock()
+            origin = self.origin(offset)
+            if origin is None:
+                raise Exception(f"No sample offset for the message at offset {offset}, a clock is needed")
+            return origin
+
+        def expire(self, now):
+            while len(self._events) > 0:
+                event, seen = next(iter(self._events.values()))
+                if now - seen <= self._window:
+                    break
+                self._events.popitem(last=False)
+
+        def data(self, in_data):
+            from X2D import freeze_x2d_message
+            out_data = []
+            idx = 0
+            while idx < len(in_data):
+                m = in_data[idx]
+                now = self.position(self._offset + idx)
+                self.expire(now)
+                key = freeze_x2d_message(m)
+                entry = self._events.get(key)
+                if entry is not None:
+                    event = entry[0]
+                    event = entry[0] = Retransmission.Event(event.offset, event.message, event.count + 1)
+                    entry[1] = now
+                    self._events.move_to_end(key)
+                    if self._sink is not None:
+                        self.info(f"Retransmission {event.count} of offset {event.offset} at {now}")
+                else:
+                    event = Retransmission.Event(now, m)
+                    self._events[key] = [event, now]
+                    if len(self._events) > self._max_size:
+                        self._events.popitem(last=False)
+                out_data.append(event)
+                idx += 1
+            return idx, out_data, Processor.Status.CONTINUE
+
+
+#
+# Pipeline
+#
+
+def _stage(processors, chunks, count_fct=None):
+    # Feed the chunks to the first processor and yield its output as soon as
+    # it is available. The generator is resumed once the following stages
+    # are done with the output, so a reset also applies to them.
+    processor = processors[0]
+    for chunk in chunks:
+        idx = 0
+        # The rest of the chunk after a reset is fed as a view, not copied
+        view = None
+        while idx < len(chunk):
+            length = len(chunk) if count_fct is None else count_fct(chunk)
+            if idx == 0 and length >= len(chunk):
+                data = chunk
+            else:
+                if view is None and isinstance(chunk, (bytes, bytearray)):
+                    view = memoryview(chunk)
+                data = (chunk if view is None else view)[idx:idx + length]
+
+            length, data, status = processor.process(data)
+            idx += length
+
+            if data is not None:
+                yield data
+
+            if status == Processor.Status.RESET:
+                for p in processors:
+                    p.reset()
+
+
+def stream(processors, chunks, count_fct=None):
+    # Chain the processors as generators: memory is bounded by the chunks and
+    # the data buffered by the processors, not by the length of the input.
+    # Since the state is kept by the processors, live data can also be pushed
+    # with successive calls on the same processors: stream(processors, [chunk])
+    for i in range(1, len(processors)):
+        processors[i].set_upstream(processors[i - 1])
+    for i in range(len(processors)):
+        chunks = _stage(processors[i:], chunks, count_fct if i == 0 else None)
+    return iter(chunks)
+
+
+def seek(processors, offset):
+    # Offset of the data to come, when it doesn't start the input. The stages
+    # fed with samples by the previous ones start at the same position of the
+    # input, in their own units, e.g. decimated samples.
+    for processor in processors:
+        processor.offset = offset
+        if not processor._sample_output:
+            break
+        offset = int(offset // processor._input_ratio)
+
+
 def process(processors, in_data, count_fct=None):
     if len(processors) == 0 or in_data is None:
         return in_data
-    idx = 0
     out_data = None
-    while idx < len(in_data):
-        length = len(in_data) if count_fct is None else count_fct(in_data)
-        data = in_data[idx:idx + length]
+    for data in stream(processors, [in_data], count_fct):
+        out_data = _set_or_extend(out_data, data)
+    return out_data
 
-        length, data, status = processors[0].process(data)
-        idx += length
 
-        data = process(processors[1:], data)
+def attach_sink(processors, sink):
+    for processor in processors:
+        processor.attach(sink)
+    return processors
+
+
+def enable_metrics(processors):
+    for processor in processors:
+        processor.enable_metrics()
+    return processors
+
+
+def metrics_snapshot(processors):
+    snapshot = []
+    for idx, processor in enumerate(processors):
+        if processor.metrics is not None:
+            snapshot.append(dict(stage=type(processor).__qualname__, index=idx, buffered=processor.buffered,
+                                 **processor.metrics.snapshot()))
+    return snapshot
+
+
+_PROMETHEUS_METRICS = [
+    ("chunks", "counter", "Chunks processed"),
+    ("input_size", "counter", "Input data consumed"),
+    ("output_size", "counter", "Output data emitted"),
+    ("resets", "counter", "Resets of the following processors"),
+    ("errors", "counter", "Errors reported"),
+    ("rejected", "counter", "Invalid frames dropped"),
+    ("skipped", "counter", "Input data skipped to resync or ignored"),
+    ("wall_time", "counter", "Wall time in seconds"),
+    ("cpu_time", "counter", "CPU time in seconds"),
+    ("buffered", "gauge", "Input data buffered"),
+]
+
+
+def prometheus_metrics(processors, prefix="x2d_processor", labels=None):
+    # Snapshot in the Prometheus text format
+    snapshot = metrics_snapshot(processors)
+    lines = []
+    for name, kind, description in _PROMETHEUS_METRICS:
+        metric = f"{prefix}_{name}" + ("_total" if kind == "counter" else "")
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for stage in snapshot:
+            stage_labels = dict(labels or {}, stage=stage["stage"], index=stage["index"])
+            text = ",".join(f'{k}="{v}"' for k, v in stage_labels.items())
+            lines.append(f"{metric}{{{text}}} {stage[name]}")
+    return "\n".join(lines) + "\n"
 
-        out_data = _set_or_extend(out_data, data)
 
-        if status == Processor.Status.RESET:
-            for p in processors:
-                p.reset()
+#
+# Parallel processing
+#
+
+def split_at_silence(in_data, min_silence, shard_size):
+    # Split the samples in shards of at least shard_size, in the middle of runs
+    # of min_silence identical samples. Choose min_silence so that both halves
+    # are invalid pulses: no frame can be in flight there and a serial
+    # decoding resets all the processors at the end of the run.
+    shards = []
+    start = 0
+    while start + shard_size < len(in_data):
+        founds = [in_data.find(bytes([v]) * min_silence, start + shard_size) for v in (0, 1)]
+        founds = [found for found in founds if found >= 0]
+        if len(founds) == 0:
+            break
+        stop = min(founds) + min_silence // 2
+        shards.append((start, stop))
+        start = stop
+    shards.append((start, len(in_data)))
+    return shards
+
+
+def _process_shard(processors_fct, in_data, offset):
+    processors = processors_fct()
+    # Report the offsets of the sample stages in the whole capture
+    seek(processors, offset)
+    return process(processors, in_data)
+
+
+def stream_parallel(processors_fct, in_data, min_silence, shard_size=1 << 22, workers=None):
+    # Yield the output of the shards in order, as stream() does for the chunks.
+    # Only a window of shards is sliced and sent to the pool at once, so the
+    # memory is bounded by the window and not by the length of the input.
+    workers = workers or os.cpu_count() or 1
+    shards = iter(split_at_silence(in_data, min_silence, shard_size))
+    futures = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            # Refill the window, then wait for its oldest shard
+            for start, stop in islice(shards, 2 * workers - len(futures)):
+                futures.append(executor.submit(_process_shard, processors_fct, in_data[start:stop], start))
+            if len(futures) == 0:
+                break
+            data = futures.popleft().result()
+            if data is not None:
+                yield data
+
+
+def process_parallel(processors_fct, in_data, min_silence, shard_size=1 << 22, workers=None):
+    # Same result as process(processors_fct(), in_data) using a process pool.
+    # processors_fct must be picklable and build processors that don't throw.
+    out_data = None
+    for data in stream_parallel(processors_fct, in_data, min_silence, shard_size, workers):
+        out_data = _set_or_extend(out_data, data)
     return out_data
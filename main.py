@@ -1,6 +1,19 @@
+import asyncio
+import contextlib
+import functools
+import io
+import itertools
 import random
+import tempfile
+import time
+import numpy as np
 import X2D as x2d
-from encoding import Processor, OOK, BiphaseMark, Manchester, X2D, X2DMessage, Bitstream, process
+from capture import BITS, PACKED, RAW, CaptureReader, build_index, decode, decode_index, index_path, open_map, \
+    pack_capture, read_chunks, read_index
+from encoding import OOK, BiphaseMark, Decimation, IQ, Manchester, X2D, X2DMessage, BitBuffer, Bitstream, \
+    Retransmission, Trace, attach_sink, enable_metrics, process, process_parallel, stream
+from receiver import Receiver, open_tcp, open_tty
+from rflink import RFLinkDebug, RFLinkPulses
 
 
 #
@@ -22,29 +35,185 @@ def print_message(name, msgs):
     print("")
 
 
-class RFLinkDecoder(Processor):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._bit = 0
-
-    def data(self, in_data):
-        out_data = bytearray()
-        idx = 0
-        s = Processor.Status.CONTINUE
-        while idx < len(in_data) and s == Processor.Status.CONTINUE:
-            d = in_data[idx]
-            if 290 < d < 340:
-                out_data.extend([self._bit, self._bit])
-                self._bit = 1 - self._bit
-            elif 80 < d < 130:
-                out_data.append(self._bit)
-                self._bit = 1 - self._bit
-            else:
-                self.error(f"Invalid pulse \"{d}\" end at offset {self._offset}")
-                s = Processor.Status.RESET
-            self._offset += 1
-            idx += 1
-        return idx, out_data, s
+def random_frame():
+    payload = [random.choice(list(x2d.MessageDataType) + [random.randint(0, 255)])]
+    payload += [random.randint(0, 255) for _ in range(random.randint(0, 8))]
+    frame = bytes([random.randint(0, 255) for _ in range(6)] + payload[:random.randint(0, len(payload))])
+    return frame + x2d.x2d_crc(frame).to_bytes(2, 'big')
+
+
+def parse_or_error(frame, fast):
+    try:
+        return x2d.parse_x2d_message(frame, fast)
+    except Exception as e:
+        return type(e)
+
+
+def check_fast_parser(frames):
+    # The fast parser has to give the same result than the Construct one
+    for frame in frames:
+        fast, construct = parse_or_error(frame, True), parse_or_error(frame, False)
+        assert fast == construct and str(fast) == str(construct), frame
+
+
+def format_or_error(frame, **kwargs):
+    try:
+        return bytes(x2d.format_x2d_message(x2d.parse_x2d_message(frame, **kwargs)))
+    except Exception as e:
+        return type(e)
+
+
+def check_slotted_parser(frames):
+    # The slotted and lazy messages have to give back the frame of the Container
+    for frame in frames:
+        container = format_or_error(frame, fast=False)
+        assert format_or_error(frame, slotted=True) == container and format_or_error(frame, lazy=True) == container, frame
+
+
+def check_frame_template(frames):
+    # A template has to build the frame of format_x2d_message and the bits of
+    # X2D.Encoder, whatever the house, zone, data and rolling code
+    msgs = [msg for msg in map(parse_or_error, frames, itertools.repeat(True)) if not isinstance(msg, type)]
+    values = [msg.data.value for msg in msgs if int(msg.transmitter.attribute) == x2d.Attribute.WithData]
+    for msg in msgs:
+        for house, zone in ((msg.house, msg.recipient.zone), (random.randint(0, 0xFFFF), random.randint(0, 15))):
+            header = dict(msg, house=house, recipient=dict(msg.recipient, zone=zone))
+            template = x2d.X2DFrameTemplate(header)
+            for value in random.sample(values, 3):
+                rolling_code = random.randint(0, 0xFFFF)
+                full = dict(header, data=dict(value=value), rollingCode=rolling_code)
+                frame = template.build(template.format_data(value), rolling_code)
+                assert frame == bytes(x2d.format_x2d_message(full)), full
+                assert process([X2D.Encoder()], [frame]) == process([X2DMessage.Encoder(), X2D.Encoder()], [full])
+
+
+def check_vectorized_decoders(samples, decimation):
+    # The vectorized and packed decoders have to give the same pulses and
+    # messages than the serial ones, whatever the chunks
+    results = []
+    for options in (dict(), dict(vectorized=True), dict(vectorized=True, packed=True)):
+        pulses = []
+        processors = get_messages_from_raw_processors(2000000, 4820, decimation=decimation, **options)
+        attach_sink([processors[-4]], lambda processor, event: pulses.append(event))
+        msgs = process(processors, samples, lambda chunk: random.randint(1, 1 << 16))
+        results.append((str(msgs), [event for event in pulses if type(event) is Trace.Pulse]))
+    assert len(results[0][1]) > 0 and results[1] == results[0] and results[2] == results[0]
+
+
+def time_process(processors, in_data):
+    # Seconds to process the data, without the errors printed on stderr
+    start = time.perf_counter()
+    with contextlib.redirect_stderr(io.StringIO()):
+        process(processors, in_data)
+    return time.perf_counter() - start
+
+
+def check_noise_timing(size):
+    # On noise each pulse is invalid and resets the processors: the vectorized
+    # decoder has to stay linear, about as fast as the serial one
+    noise = bytearray(random.randint(0, 1) for _ in range(size))
+    serial, vectorized = (time_process([OOK.Decoder(2000000, 4820, vectorized=v, throw=False)], noise)
+                          for v in (False, True))
+    assert vectorized < 3 * serial + 0.1, (serial, vectorized)
+
+
+def check_noise_scaling(processors_fct, size, packed=False):
+    # An invalid symbol has to cost the same wherever it is in the data: 4
+    # times more noise takes about 4 times longer, not 16
+    noise = bytearray(random.randint(0, 1) for _ in range(4 * size))
+    short, long = (time_process(processors_fct(), BitBuffer.from_bits(noise[:n]) if packed else noise[:n])
+                   for n in (size, 4 * size))
+    assert long < 8 * short + 0.1, (short, long)
+
+
+def iq_samples(samples, format, amplitude, noise):
+    # I/Q of a carrier keyed by the OOK samples, with a gaussian noise
+    dtype, zero = IQ.FORMATS[format]
+    rng = np.random.default_rng(0)
+    levels = np.frombuffer(bytes(samples), dtype=np.uint8) * amplitude
+    phases = np.arange(len(levels)) * 0.3
+    iq = np.empty(2 * len(levels))
+    iq[0::2] = levels * np.cos(phases)
+    iq[1::2] = levels * np.sin(phases)
+    iq += zero + rng.normal(0, noise, len(iq))
+    if np.dtype(dtype).kind != "f":
+        info = np.iinfo(dtype)
+        iq = np.clip(np.round(iq), info.min, info.max)
+    return bytearray(iq.astype(dtype).tobytes())
+
+
+def check_iq_decoder(samples, msgs):
+    # The OOK samples of the I/Q have to be the keyed ones, but around the
+    # edges delayed by the smoothing, and decode to the same messages
+    edges = np.count_nonzero(np.diff(np.frombuffer(bytes(samples), dtype=np.uint8)))
+    for format, scale in (("cu8", 127), ("cs8", 127), ("cs16", 32767), ("cf32", 1)):
+        iq = iq_samples(samples, format, 0.7 * scale, 0.05 * scale)
+        ook = np.frombuffer(bytes(process([IQ.Decoder(format)], iq)), dtype=np.uint8)
+        assert np.count_nonzero(ook != np.frombuffer(bytes(samples), dtype=np.uint8)) < 24 * edges, format
+        for decimation in (1, 8):
+            decoded = process(get_messages_from_iq_processors(2000000, 4820, format, decimation), iq,
+                              lambda chunk: random.randint(1, 1 << 16))
+            assert str(decoded) == str(msgs), (format, decimation)
+
+
+def check_capture_index(path, format, processors_fct):
+    # Pack the capture and index it: decoding the windows of the index, from
+    # the packed capture or from the original one, has to give the messages
+    # and the traces of the first processor of the whole decoding
+    def decode_traced(capture):
+        events = []
+        processors = attach_sink(processors_fct()[:1], lambda processor, event: events.append(event)) + \
+            processors_fct()[1:]
+        decoded = [msg for msgs in decode(processors, capture) for msg in msgs]
+        return decoded, [e for e in events if type(e) in (Trace.Pulse, Trace.Symbol)]
+
+    packed = f"{path}.x2dc"
+    pack_capture(path, packed, format)
+    windows = build_index(processors_fct(), CaptureReader(packed, PACKED))
+    assert read_index(index_path(packed)) == windows and len(windows) > 0
+    whole, traces = decode_traced(CaptureReader(path, format))
+    for capture_path, capture_format in ((packed, PACKED), (path, format)):
+        results = [decode_traced(CaptureReader(capture_path, capture_format, start=start, stop=stop))
+                   for start, stop in windows]
+        assert str([msg for decoded, _ in results for msg in decoded]) == str(whole), capture_format
+        for (start, stop), (_, events) in zip(windows, results):
+            # The last pulse of a window may be cut by its end
+            first = [e.offset for e in traces].index(start)
+            assert len(events) > 0 and events == traces[first:first + len(events)], capture_format
+            assert all(e.offset < stop for e in events), capture_format
+
+
+async def check_receiver(symbols, count):
+    # The end is published without waiting for a full subscription, and a
+    # closed one doesn't hold the receiver
+    receiver = Receiver(get_messages_from_baud_processors(), chunk_size=64)
+    full, closed = receiver.subscribe(max_size=count), receiver.subscribe(max_size=1)
+    reader = asyncio.StreamReader()
+    reader.feed_data(bytes(symbols))
+    reader.feed_eof()
+    task = asyncio.ensure_future(receiver.run(reader))
+    await closed.get()
+    closed.close()
+    await asyncio.wait_for(task, 10)
+    assert len([msg async for msg in full]) == count
+
+
+def rflink_line(durations):
+    return f"20;00;DEBUG;Pulses={len(durations)};Pulses(uSec)={','.join(map(str, durations))};\r\n".encode()
+
+
+def check_bit_buffer(bits, count):
+    # A BitBuffer has to hold the same bits than a bytearray, whatever the deleted heads
+    packed = BitBuffer.from_bits(bits)
+    for _ in range(count):
+        size = random.randint(0, 40)
+        del bits[:size], packed[:size]
+        extra = bytearray(random.randint(0, 1) for _ in range(random.randint(0, 40)))
+        bits.extend(extra)
+        packed.extend(extra if random.random() < 0.5 else BitBuffer.from_bits(extra))
+        start = random.randint(0, len(bits))
+        assert packed == bits and packed[start:] == bits[start:]
+        assert packed.find([1] * 5, start) == bits.find(b'\x01' * 5, start)
 
 
 #
@@ -52,46 +221,43 @@ class RFLinkDecoder(Processor):
 #
 
 
-def get_messages_from_baud_processors():
-    return [BiphaseMark.Decoder(verbose=False), X2D.Decoder(verbose=False, throw=False),
-            X2DMessage.Decoder(verbose=False)]
+def get_messages_from_baud_processors(resync=False):
+    # In resync mode, the symbols and bits after an error are scanned again
+    return [BiphaseMark.Decoder(verbose=False, resync=resync), X2D.Decoder(verbose=False, throw=False, resync=resync),
+            X2DMessage.Decoder(check=True, verbose=False)]
+
 
+def get_messages_from_raw_processors(sample_rate, symbol_rate, vectorized=False, packed=False, decimation=1,
+                                     resync=False):
+    # The offsets of the processors are still in samples with a decimation
+    decimate = [Decimation.Decoder(decimation, vectorized=vectorized)] if decimation > 1 else []
+    return decimate + [OOK.Decoder(sample_rate, symbol_rate, vectorized=vectorized, packed=packed,
+                                   decimation=decimation, verbose=False, throw=False)] + \
+        get_messages_from_baud_processors(resync)
 
-def get_messages_from_raw_processors(sample_rate, symbol_rate):
-    return [OOK.Decoder(sample_rate, symbol_rate, verbose=False, throw=False)] + get_messages_from_baud_processors()
 
+def get_messages_from_iq_processors(sample_rate, symbol_rate, format="cu8", decimation=1):
+    return [IQ.Decoder(format, throw=False)] + \
+        get_messages_from_raw_processors(sample_rate, symbol_rate, vectorized=True, decimation=decimation)
 
-def get_messages_from_cc1101_manchester_processors():
-    return [Bitstream.Encoder(), Manchester.Encoder(bytearray([0]))] + get_messages_from_baud_processors()
+
+def get_messages_from_cc1101_manchester_processors(packed=False):
+    return [Bitstream.Encoder(packed=packed), Manchester.Encoder(bytearray([0]))] + get_messages_from_baud_processors()
 
 
 def get_messages_from_rflink_debug_processors():
-    return [RFLinkDecoder(throw=False)] + get_messages_from_baud_processors()
+    return [RFLinkDebug.Decoder(throw=False), RFLinkPulses.Decoder(throw=False)] + get_messages_from_baud_processors()
 
 
 #
 # Process the data
 #
 """
-with open("raw3.bin", 'rb') as file:
-    data = bytearray(file.read())
-    in_data_1 = process([OOK.Decoder(int(2000000 / 20), int(4820), verbose=False, throw=False)], data)
-    # in_data_2 = process([BiphaseMark.Decoder(verbose=False)], in_data_1)
-    # in_data_3 = process([X2D.Decoder(verbose=False, throw=False)], in_data_2)
-    # msgs = process([X2DMessage.Decoder(verbose=False)], in_data_3)
-    # print_message("raw.bin", msgs)
-    msgs = process(get_messages_from_raw_processors(int(2000000 / 20), int(4820)), data)
+for msgs in decode(get_messages_from_raw_processors(int(2000000 / 20), int(4820)), CaptureReader("raw3.bin")):
     print_message("raw3.bin", msgs)
 """
 """
-with open("raw4.bin", 'rb') as file:
-    data = bytearray(file.read())
-    #in_data_1 = process([OOK.Decoder(int(2000000 / 20), int(4820), verbose=False, throw=False)], data)
-    #in_data_2 = process([BiphaseMark.Decoder(verbose=False)], in_data_1)
-    #in_data_3 = process([X2D.Decoder(verbose=True, throw=False)], in_data_2)
-    #msgs = process([X2DMessage.Decoder(verbose=True)], in_data_3)
-    #print_message("raw.bin", msgs)
-    msgs = process(get_messages_from_raw_processors(int(2000000 / 20), int(4820)), data)
+for msgs in decode(get_messages_from_raw_processors(int(2000000 / 20), int(4820)), CaptureReader("raw4.bin")):
     print_message("raw4.bin", msgs)
 
 for d in [[0x33, 0x33, 0x2a, 0xab, 0x55, 0x2c, 0xcd, 0x2b, 0x53, 0x32, 0xb3, 0x33, 0x4b, 0x33, 0x34, 0xb2, 0xd2, 0xcc, 0xcc, 0xcc, 0xcc, 0xcc, 0xd5, 0x52, 0xb4, 0xcd, 0x2a, 0xaa, 0xb5, 0x55]]:
@@ -103,37 +269,81 @@ for d in [[0x33, 0x33, 0x2a, 0xab, 0x55, 0x2c, 0xcd, 0x2b, 0x53, 0x32, 0xb3, 0x3
     
 """
 """
-with open("raw.bin", 'rb') as file:
-    in_data_0 = bytearray(file.read())
-    in_data_1 = process([OOK.Decoder(2000000, 4820, verbose=False, throw=False)], in_data_0)
-    in_data_2 = process([BiphaseMark.Decoder(verbose=False)], in_data_1)
-    in_data_3 = process([X2D.Decoder(verbose=False)], in_data_2)
-    msgs = process([X2DMessage.Decoder(verbose=False)], in_data_3)
-    print_message("raw.bin", msgs)
-    out_data_3 = process([X2DMessage.Encoder()], msgs)
-    # for m in out_data_3:
-    #    print(''.join('0x{:02x}, '.format(x) for x in m))
-    out_data_2 = process([X2D.Encoder()], out_data_3)
-    assert out_data_2[:len(in_data_2)] == in_data_2
-    out_data_1 = process([BiphaseMark.Encoder()], out_data_2)
-    assert out_data_1[:len(in_data_1)] == in_data_1
-    out_data_0 = process([Bitstream.Decoder(False, verbose=False)], out_data_1)
-    # print(''.join('0x{:02x}, '.format(x) for x in out_data_0))
-
-with open("raw2.bin", 'rb') as file:
-    in_data_0 = bytearray(file.read())
-    in_data_1 = process([OOK.Decoder(2000000, 4820, verbose=False, throw=False)], in_data_0)
-    in_data_1_1 = process([Bitstream.Decoder(False, verbose=False)], in_data_1)
-    # print(''.join('0x{:02x}, '.format(x) for x in in_data_1_1))
-    in_data_2 = process([BiphaseMark.Decoder(verbose=False)], in_data_1)
-    in_data_3 = process([X2D.Decoder(verbose=False)], in_data_2)
-    msgs = process([X2DMessage.Decoder(verbose=False)], in_data_3)
-    print_message("raw2.bin", msgs)
+# Only the symbols are kept in memory, not the samples
+in_data_1 = bytearray().join(decode([OOK.Decoder(2000000, 4820, verbose=False, throw=False)],
+                                    CaptureReader("raw.bin")))
+in_data_2 = process([BiphaseMark.Decoder(verbose=False)], in_data_1)
+in_data_3 = process([X2D.Decoder(verbose=False)], in_data_2)
+msgs = process([X2DMessage.Decoder(verbose=False)], in_data_3)
+print_message("raw.bin", msgs)
+out_data_3 = process([X2DMessage.Encoder()], msgs)
+# for m in out_data_3:
+#    print(''.join('0x{:02x}, '.format(x) for x in m))
+out_data_2 = process([X2D.Encoder()], out_data_3)
+assert out_data_2[:len(in_data_2)] == in_data_2
+out_data_1 = process([BiphaseMark.Encoder()], out_data_2)
+assert out_data_1[:len(in_data_1)] == in_data_1
+out_data_0 = process([Bitstream.Decoder(False, verbose=False)], out_data_1)
+# print(''.join('0x{:02x}, '.format(x) for x in out_data_0))
 
-with open("baud.bin") as file:
-    data = bytearray([1 if a == '1' else 0 for a in file.read()])
-    msgs = process(get_messages_from_baud_processors(), data, lambda x: random.randint(1, min(len(x), 64)))
+# Only the symbols are kept in memory, not the samples
+in_data_1 = bytearray().join(decode([OOK.Decoder(2000000, 4820, verbose=False, throw=False)],
+                                    CaptureReader("raw2.bin")))
+in_data_1_1 = process([Bitstream.Decoder(False, verbose=False)], in_data_1)
+# print(''.join('0x{:02x}, '.format(x) for x in in_data_1_1))
+in_data_2 = process([BiphaseMark.Decoder(verbose=False)], in_data_1)
+in_data_3 = process([X2D.Decoder(verbose=False)], in_data_2)
+msgs = process([X2DMessage.Decoder(verbose=False)], in_data_3)
+print_message("raw2.bin", msgs)
+
+for msgs in decode(get_messages_from_baud_processors(), CaptureReader("baud.bin", BITS),
+                   lambda x: random.randint(1, min(len(x), 64))):
     print_message("baud.bin", msgs)
+
+# rtl_sdr -f 433.92M -s 2.4M - | python main.py, or a file of the same I/Q
+for msgs in stream(get_messages_from_iq_processors(2400000, 4820, decimation=16), read_chunks("-")):
+    print_message("rtl_sdr", msgs)
+
+# Pack the capture 8 samples per byte and index its frames once, then only
+# the windows of the frames are decoded
+pack_capture("raw.bin", "raw.x2dc", RAW, 2000000, 4820)
+build_index(get_messages_from_raw_processors(2000000, 4820), CaptureReader("raw.x2dc", PACKED))
+for msgs in decode_index(get_messages_from_raw_processors(2000000, 4820), "raw.x2dc"):
+    print_message("raw.x2dc (indexed)", msgs)
+
+# 13 samples per symbol instead of 415
+for msgs in decode(get_messages_from_raw_processors(2000000, 4820, decimation=32), CaptureReader("raw.bin")):
+    print_message("raw.bin (decimated)", msgs)
+
+# Decode a window of an archive, the errors report the offsets in the file
+for msgs in decode(get_messages_from_raw_processors(2000000, 4820, vectorized=True),
+                   CaptureReader("archive.bin", start=1 << 30, stop=2 << 30)):
+    print_message("archive.bin", msgs)
+
+# Split at silences of 8 symbols, only the shards are read in memory
+msgs = process_parallel(functools.partial(get_messages_from_raw_processors, 2000000, 4820), open_map("raw.bin"),
+                        8 * int(2000000 / 4820), 1 << 18)
+print_message("raw.bin (parallel)", msgs)
+
+# Only the messages of our house, their payload is parsed when printed
+processors = get_messages_from_raw_processors(2000000, 4820)
+processors[-1] = X2DMessage.Decoder(check=True, lazy=True, accept=x2d.MessageFilter(houses=[12136]))
+for msgs in decode(processors, CaptureReader("raw.bin")):
+    print_message("raw.bin (house 12136)", msgs)
+
+async def print_messages(name, subscription):
+    async for msg in subscription:
+        print_message(name, [msg])
+
+async def receive():
+    # Several radios decoded in the same event loop
+    raw = Receiver(get_messages_from_raw_processors(2000000, 4820))
+    cc1101 = Receiver(get_messages_from_cc1101_manchester_processors())
+    await asyncio.gather(raw.run(await open_tcp("localhost", 1234)),
+                         cc1101.run(await open_tty("/dev/ttyUSB0", 115200)),
+                         print_messages("raw", raw.subscribe()), print_messages("cc1101", cc1101.subscribe()))
+
+asyncio.run(receive())
 """
 AssoArea3 = [0x55, 0x7f, 0x5d, 0xa4, 0xca, 0x95, 0x32, 0x52, 0x55, 0x3f, 0x27, 0xff, 0xc0]
 AssoArea2 = [0x55, 0x7f, 0x5d, 0xa4, 0xca, 0xD5, 0x32, 0x52, 0x55, 0x3f, 0x18, 0x00, 0x3f]
@@ -197,7 +407,8 @@ Pulse1 = [2550, 300, 330, 300, 330, 300, 330, 300, 330, 90, 120, 90, 120, 90, 12
           300, 330, 90, 120, 300, 330]
 # [0x81, 0x48, 0x52, 0x0, 0x85, 0x90, 0x22, 0x81, 0x20, 0x93, 0xfc, 0x7a]
 for name, data in [('Pulse1', Pulse1)]:
-    msgs = process(get_messages_from_rflink_debug_processors(), data)
+    line = f"20;00;DEBUG;Pulses={len(data)};Pulses(uSec)={','.join(map(str, data))};\r\n"
+    msgs = process(get_messages_from_rflink_debug_processors(), bytearray(line.encode()))
     print_message(name, msgs)
 """
 data = [
@@ -224,6 +435,154 @@ data = [
 ]
 msgs = process([X2DMessage.Decoder(verbose=False)], data)
 print_message("data", msgs)
+check_fast_parser([bytes(d) for d in data] + [random_frame() for _ in range(1000)])
+check_slotted_parser([bytes(d) for d in data] + [random_frame() for _ in range(1000)])
+check_frame_template([bytes(d) for d in data] + [random_frame() for _ in range(200)])
+check_bit_buffer(bytearray(random.randint(0, 1) for _ in range(1000)), 1000)
+
+# A frame flagged with a rolling code is dropped without it, its 2 bytes are missing
+frame = bytes(data[2][:7]) + x2d.x2d_crc(data[2][:7]).to_bytes(2, 'big')
+assert not x2d.check_x2d_frame(frame) and not x2d.MessageFilter()(frame)
+assert process([X2DMessage.Decoder(check=True)], [frame, data[2]]) == process([X2DMessage.Decoder()], [data[2]])
+
+# Samples of encoded symbols decode back to them, a symbol lasts 414.9 samples.
+# The last pulse is only decoded once ended by the opposite level.
+symbols = process([X2DMessage.Encoder(), X2D.Encoder(), BiphaseMark.Encoder()], msgs)
+samples = process([OOK.Encoder(2000000, 4820)], symbols + bytearray([1 - symbols[-1]]))
+assert process([OOK.Decoder(2000000, 4820)], samples) == symbols
+asyncio.run(check_receiver(symbols, len(msgs)))
+
+# A "0" is stuffed after each run of five "1", e.g. in 0x1f 0xff 0xff
+frames = process([X2DMessage.Encoder()], msgs)
+assert list(map(bytes, process([X2D.Decoder()], process([X2D.Encoder()], frames)))) == list(map(bytes, frames))
+
+# The end of a long frame is awaited past its stuffed "0", whatever the size of the chunks
+bits = process([X2D.Encoder()], frames)
+assert list(map(bytes, process([X2D.Decoder()], bits, lambda chunk: 7))) == list(map(bytes, frames))
+
+# Decoding resumes after an invalid pulse pair, also when half a pair was buffered,
+# and on noise an invalid pair costs the same wherever it is
+pulses = process([Manchester.Encoder(None)], symbols)
+pulses = pulses + bytearray([1, 1]) + pulses
+for size in (len(pulses), 3):
+    assert process([Manchester.Decoder(throw=False)], pulses, lambda chunk: size) == symbols + symbols
+for packed in (False, True):
+    check_noise_scaling(lambda: [Manchester.Decoder(throw=False)], 1 << 14, packed)
+
+# In resync mode, a lost symbol only loses its frame: the data after an error
+# is scanned again instead of being dropped with the buffers, so the skipped
+# data doesn't depend on the chunks either. Noise stays linear.
+broken = symbols[:400] + symbols[401:]
+for resync in (False, True):
+    results = []
+    for size in (len(broken), 7):
+        processors = enable_metrics(get_messages_from_baud_processors(resync))
+        decoded = process(processors, broken, lambda chunk: size)
+        results.append((str(decoded), [processor.metrics.skipped for processor in processors] if resync else None))
+    assert results[0] == results[1] and (len(decoded) == len(msgs) - 1) == resync
+check_noise_scaling(lambda: [BiphaseMark.Decoder(resync=True)], 1 << 14)
+check_noise_scaling(lambda: [Manchester.Decoder(resync=True, throw=False)], 1 << 14)
+
+# Only the decoded symbols are traced, an invalid pulse pair is traced as an error
+events = []
+pulses = bytearray([2, 2]) + process([BiphaseMark.Encoder()], symbols)
+assert process([BiphaseMark.Decoder(sink=lambda processor, event: events.append(event))], pulses) == symbols
+assert type(events[0]) is Trace.Error and [e.value for e in events[1:]] == list(symbols)
+
+# A carrier keyed by the samples, in any I/Q format, decodes to the same messages
+check_iq_decoder(bytearray(20000) + samples + bytearray(20000), msgs)
+
+# Bursts split at their silences decode the same in parallel, with more shards than in flight
+capture = (bytearray(20000) + samples + bytearray(20000)) * 4
+processors_fct = functools.partial(get_messages_from_raw_processors, 2000000, 4820, vectorized=True)
+parallel = process_parallel(processors_fct, capture, 8 * int(2000000 / 4820), 1 << 16, workers=1)
+assert len(parallel) == 4 * len(msgs) and str(parallel) == str(process(processors_fct(), capture))
+
+# Also with noise and after a decimation
+noisy = bytearray(capture)
+for idx in random.sample(range(len(noisy)), 2000):
+    noisy[idx] ^= 1
+for decimation in (1, 8):
+    check_vectorized_decoders(noisy, decimation)
+check_noise_timing(1 << 16)
+
+# The rest of the data after a reset is fed as a view, not copied: the glitches
+# of a long capture cost the same wherever they are
+glitches = bytearray(1 << 21)
+glitches[::256] = bytes([1]) * (len(glitches) // 256)
+short, long = (time_process([OOK.Decoder(2000000, 4820, throw=False)], glitches[:n])
+               for n in (len(glitches) // 4, len(glitches)))
+assert long < 8 * short + 0.1, (short, long)
+
+# The pulses are traced at their offsets in the file, also when decoded from its middle after a decimation
+with tempfile.NamedTemporaryFile() as file:
+    file.write(capture)
+    file.flush()
+    start = (len(capture) // 2 - 10000) // 8 * 8
+    pulses = []
+    for offset in (0, start):
+        events = []
+        processors = get_messages_from_raw_processors(2000000, 4820, decimation=8)
+        attach_sink(processors[:2], lambda processor, event: events.append(event))
+        decoded = sum(map(len, decode(processors, CaptureReader(file.name, start=offset))))
+        assert decoded == (4 if offset == 0 else 2) * len(msgs)
+        pulses.append([e for e in events if type(e) is Trace.Pulse and e.offset >= start])
+    assert len(pulses[1]) > 0 and pulses[0] == pulses[1]
+
+# A packed capture seeks to the frames of its index, in samples or in bits, the same as the
+# capture it was packed from, an ASCII bit capture with its line breaks included
+with tempfile.TemporaryDirectory() as directory:
+    with open(f"{directory}/raw.bin", "wb") as file:
+        file.write(capture)
+    check_capture_index(f"{directory}/raw.bin", RAW, functools.partial(get_messages_from_raw_processors, 2000000, 4820))
+    with open(f"{directory}/baud.bin", "wb") as file:
+        for _ in range(3):
+            for idx in range(0, len(symbols), 64):
+                file.write(bytes(symbols[idx:idx + 64]).translate(bytes.maketrans(b"\x00\x01", b"01")) + b"\n")
+    check_capture_index(f"{directory}/baud.bin", BITS, get_messages_from_baud_processors)
+
+# The RFLink pulses of the symbols decode back to their messages. The reset of an invalid pulse
+# resumes its line after it, any other reset drops the rest of the line, and the offsets of the
+# pulses go on across the lines and the resets.
+durations = [100 if len(list(run)) == 1 else 310 for _, run in itertools.groupby(symbols)]
+events = []
+processors = get_messages_from_rflink_debug_processors()
+attach_sink(processors[1:2], lambda processor, event: events.append(event))
+decoded = process(processors, bytearray(rflink_line([1000] + durations)))
+for processor in processors:
+    processor.reset()
+decoded += process(processors, bytearray(rflink_line(durations + [1000])))
+assert str(decoded) == str(msgs + msgs)
+pulses = attach_sink([RFLinkPulses.Decoder(throw=False)], lambda processor, event: events.append(event))[0]
+for line in ([100, 1000, 100], [1000]):
+    assert pulses.process([line])[2] == RFLinkPulses.Decoder.Status.RESET
+    pulses.reset()
+    pulses.reset()
+assert [e.text for e in events if type(e) is Trace.Error] == [f'Invalid pulse "1000" at offset {offset}'
+                                                              for offset in (0, 2 * len(durations) + 1, 1, 3)]
+
+# The copies of a message are collapsed by their offsets in the capture, whatever the chunks:
+# the first copy is emitted as a new event, the following ones as updates of its count
+for window, counts in ((400000, [1] * 4 * len(msgs)), (2000000, [4] * len(msgs))):
+    whole, chunked = (process(processors_fct() + [Retransmission.Decoder(window)], capture, count_fct)
+                      for count_fct in (None, lambda chunk: 4096))
+    last = {e.offset: e for e in whole}
+    assert [e.count for e in whole if e.count == 1] == [1] * len(counts)
+    assert [e.count for e in last.values()] == counts
+    assert [(e.offset, e.count) for e in whole] == [(e.offset, e.count) for e in chunked]
+    assert all(e.offset % 1 == 0 and e.offset < len(capture) for e in whole)
+
+# Without sample offsets, e.g. RFLink pulses, the window needs a clock
+line = rflink_line(durations)
+clock = itertools.count().__next__
+events = process(get_messages_from_rflink_debug_processors() + [Retransmission.Decoder(10, clock)], bytearray(line))
+assert [e.offset for e in events] == list(range(len(msgs)))
+error = None
+try:
+    process(get_messages_from_rflink_debug_processors() + [Retransmission.Decoder(10)], bytearray(line))
+except Exception as e:
+    error = str(e)
+assert error is not None and error.startswith("No sample offset"), error
 
 """
 House: 12136
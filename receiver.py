@@ -0,0 +1,121 @@
+import asyncio
+import os
+import termios
+import tty
+
+from encoding import stream
+
+
+#
+# Sources
+#
+
+async def open_tcp(host, port):
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.create_connection(lambda: asyncio.StreamReaderProtocol(reader), host, port)
+    return reader
+
+
+async def open_tty(path, baudrate=None):
+    # Serial device or pty, read in raw mode so that no byte is translated
+    fd = os.open(path, os.O_RDONLY | os.O_NOCTTY | os.O_NONBLOCK)
+    tty.setraw(fd)
+    if baudrate is not None:
+        speed = getattr(termios, f"B{baudrate}")
+        attributes = termios.tcgetattr(fd)
+        attributes[4] = attributes[5] = speed
+        termios.tcsetattr(fd, termios.TCSANOW, attributes)
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(fd, 'rb', buffering=0))
+    return reader
+
+
+#
+# Receiver
+#
+
+class Subscription(object):
+    def __init__(self, receiver, max_size):
+        self._receiver = receiver
+        self._queue = asyncio.Queue(max_size)
+        self._closed = False
+        self._ended = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        # The messages queued before the end are still read
+        if self._ended and self._queue.empty():
+            raise StopAsyncIteration
+        msg = await self._queue.get()
+        if msg is Receiver.END:
+            raise StopAsyncIteration
+        return msg
+
+    async def get(self):
+        return await self.__anext__()
+
+    def end(self):
+        # Never waits: without room in the queue, the end is seen once the
+        # queued messages are read
+        self._ended = True
+        if not self._queue.full():
+            self._queue.put_nowait(Receiver.END)
+
+    def close(self):
+        # A subscriber that stops reading has to close its subscription: the
+        # queued messages are dropped, which releases a publish waiting for
+        # room, and no message is queued anymore
+        if self._closed:
+            return
+        self._closed = True
+        self._receiver._subscriptions.remove(self)
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+
+class Receiver(object):
+    END = object()
+
+    def __init__(self, processors, chunk_size=4096, convert=bytearray):
+        # The chunks read from the source are converted to the input of the
+        # first processor, bytearray keeps the buffered data extendable
+        self._processors = processors
+        self._chunk_size = chunk_size
+        self._convert = convert
+        self._subscriptions = []
+
+    def subscribe(self, max_size=64):
+        # A full subscription holds the receiver, and so the reading of its
+        # source: a slow subscriber slows down the radio, never the other way
+        subscription = Subscription(self, max_size)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    async def publish(self, msg):
+        for subscription in list(self._subscriptions):
+            # Closed while waiting for another subscriber
+            if not subscription._closed:
+                await subscription._queue.put(msg)
+
+    async def feed(self, chunk):
+        for data in stream(self._processors, [self._convert(chunk)]):
+            for msg in data:
+                await self.publish(msg)
+
+    async def run(self, reader):
+        # Decode the source until its end, the other receivers of the event
+        # loop run while waiting for data or for the subscribers
+        try:
+            while True:
+                chunk = await reader.read(self._chunk_size)
+                if len(chunk) == 0:
+                    break
+                await self.feed(chunk)
+        finally:
+            # Also when cancelled, without waiting for the subscribers
+            for subscription in list(self._subscriptions):
+                subscription.end()
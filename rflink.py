@@ -0,0 +1,113 @@
+from itertools import cycle, repeat
+
+from encoding import Processor, _set_or_extend
+
+
+class RFLinkDebug(object):
+    # 20;XX;DEBUG;Pulses=511;Pulses(uSec)=2550,300,330,...;
+    PULSES_FIELD = b"Pulses(uSec)="
+    MAX_LINE_LENGTH = 1 << 16
+
+    class Decoder(Processor):
+        # Bytes of the RFLink serial output to the pulse durations of each
+        # debug line, the other lines are ignored
+        def parse_line(self, line, offset):
+            start = line.find(RFLinkDebug.PULSES_FIELD)
+            if start < 0:
+                if self._sink is not None:
+                    self.info(f"Ignoring line at offset {offset} of size {len(line)}")
+                return None
+            start += len(RFLinkDebug.PULSES_FIELD)
+            end = line.find(b";", start)
+            try:
+                return list(map(int, line[start:end if end >= 0 else len(line)].split(b",")))
+            except ValueError:
+                self.error(f"Invalid pulses at offset {offset + start}")
+                return None
+
+        def data(self, in_data):
+            if isinstance(in_data, memoryview):
+                in_data = in_data.tobytes()
+            out_data = None
+            idx = 0
+            while True:
+                end = in_data.find(b"\n", idx)
+                if end < 0:
+                    if len(in_data) - idx > RFLinkDebug.MAX_LINE_LENGTH:
+                        self.error(f"Line too long at offset {self._offset + idx}")
+                        idx = len(in_data)
+                    break
+                pulses = self.parse_line(in_data[idx:end], self._offset + idx)
+                if pulses is not None:
+                    out_data = _set_or_extend(out_data, [pulses])
+                idx = end + 1
+            return idx, out_data, Processor.Status.CONTINUE
+
+
+class RFLinkPulses(object):
+    INVALID = 0
+    SHORT = 1
+    LONG = 2
+
+    class Decoder(Processor):
+        # Pulse durations of each line to bits, a pulse inverts the level and
+        # lasts one (short) or two (long) bits. The following processors are
+        # reset at each invalid pulse and at the end of each line.
+        def __init__(self, short=(80, 130), long=(290, 340), *args, **kwargs):
+            # Kinds of the current line, position in it and offset of the line,
+            # set before the first reset()
+            self._line_kinds = None
+            self._position = 0
+            self._pulse_offset = 0
+            # Set when the reset is the one of an invalid pulse of the line
+            self._resume = False
+            super().__init__(*args, **kwargs)
+            # Kind of the valid durations, the others are invalid
+            self._kinds = {d: RFLinkPulses.SHORT for d in range(short[0] + 1, short[1])}
+            self._kinds.update({d: RFLinkPulses.LONG for d in range(long[0] + 1, long[1])})
+            self._bit = 0
+
+        def reset(self):
+            super().reset()
+            # After an invalid pulse, the line is fed again and decoded from
+            # the pulse after it. Any other reset drops the rest of the line,
+            # its pulses still count for the offsets.
+            if not self._resume and self._line_kinds is not None:
+                self._pulse_offset += len(self._line_kinds)
+                self._line_kinds = None
+                self._position = 0
+            self._resume = False
+
+        def classify(self, pulses):
+            return bytes(map(self._kinds.get, pulses, repeat(RFLinkPulses.INVALID)))
+
+        def data(self, in_data):
+            pulses = in_data[0]
+            if self._position == 0:
+                self._line_kinds = self.classify(pulses)
+            kinds = self._line_kinds
+            start = self._position
+            stop = kinds.find(RFLinkPulses.INVALID, start)
+            if stop < 0:
+                stop = len(kinds)
+
+            out_data = bytearray()
+            levels = cycle((self._bit, 1 - self._bit))
+            out_data.extend(b"".join(map(_PULSE_BITS.__getitem__, zip(kinds[start:stop], levels))))
+            self._bit ^= (stop - start) & 1
+
+            if stop < len(kinds):
+                self.error(f"Invalid pulse \"{pulses[stop]}\" at offset {self._pulse_offset + stop}")
+                self._position = stop + 1
+                self._resume = True
+                return 0, out_data, Processor.Status.RESET
+
+            # End of the line
+            self._position = 0
+            self._line_kinds = None
+            self._pulse_offset += len(pulses)
+            return 1, out_data, Processor.Status.RESET
+
+
+_PULSE_BITS = {(kind, bit): bytes([bit]) * kind
+               for kind in (RFLinkPulses.SHORT, RFLinkPulses.LONG) for bit in (0, 1)}
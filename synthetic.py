@@ -0,0 +1,167 @@
+import argparse
+import json
+import random
+
+from itertools import groupby
+
+import X2D as x2d
+from encoding import X2DMessage, X2D, BiphaseMark, process
+
+# Content sizes of the known data types, the others get random contents
+_CONTENT_LENGTHS = {
+    x2d.MessageDataType.Enrollment: (0,),
+    x2d.MessageDataType.HeatingLevel: (1, 3),
+    x2d.MessageDataType.FunctioningLevel: (1, 3),
+    x2d.MessageDataType.CurrentLevel: (1, 3),
+    x2d.MessageDataType.InternalTemperature: (2,),
+    x2d.MessageDataType.MeterReading: (5,),
+    x2d.MessageDataType.BasicCommand: (1,),
+    x2d.MessageDataType.VariationCommand: (3,),
+}
+
+
+class CaptureGenerator(object):
+    # Captures of OOK samples (one byte 0 or 1 per sample, as raw.bin) made of
+    # bursts of random messages separated by silences. Everything is drawn from
+    # the seed, the same arguments always give the same capture.
+    def __init__(self, seed=0, sample_rate=2000000, symbol_rate=4820, devices=None, data_types=None,
+                 rolling_code=0.5, repetitions=(2, 5), silence=(20000, 200000), jitter=0.0, noise=0.0):
+        self._rng = random.Random(seed)
+        self._threshold = sample_rate / symbol_rate
+        self._devices = list(devices or x2d.Device)
+        self._data_types = list(data_types or x2d.MessageDataType)
+        self._rolling_code = rolling_code
+        self._repetitions = repetitions
+        self._silence = silence
+        # Standard deviation of the pulse widths, relative to their width
+        self._jitter = jitter
+        # Probability of a sample to be flipped
+        self._noise = noise
+        self._next_flip = self.flip_gap()
+        self._offset = 0
+
+    def message(self):
+        # A random message and its frame, drawn until Construct builds the
+        # frame back from the message
+        rng = self._rng
+        while True:
+            rolling_code = rng.random() < self._rolling_code
+            data_type = rng.choice(self._data_types)
+            length = rng.choice(_CONTENT_LENGTHS.get(data_type, range(5)))
+            body = bytes([rng.randrange(256), rng.randrange(256),
+                          rng.randrange(4) << 6 | rng.choice(self._devices), rng.randrange(16),
+                          x2d.Attribute.WithData, 0x90 | (0x08 if rolling_code else 0x00), data_type])
+            body += bytes(rng.randrange(256) for _ in range(length + (2 if rolling_code else 0)))
+            frame = body + x2d.x2d_crc(body).to_bytes(2, 'big')
+            try:
+                msg = x2d.parse_x2d_message(frame)
+                if x2d.format_x2d_message(msg) == frame:
+                    return msg, frame
+            except Exception:
+                pass
+
+    def flip_gap(self):
+        if self._noise <= 0:
+            return None
+        return int(self._rng.expovariate(self._noise))
+
+    def synthesize(self, symbols):
+        # Samples of the symbols, each pulse width is jittered
+        samples = bytearray()
+        position = 0.0
+        for level, run in groupby(symbols):
+            width = sum(1 for _ in run) * self._threshold
+            if self._jitter > 0:
+                width *= max(0.0, 1 + self._rng.gauss(0, self._jitter))
+            count = round(position + width) - round(position)
+            position += width
+            samples += bytes([level]) * count
+        return samples
+
+    def add_noise(self, samples):
+        if self._next_flip is None:
+            return
+        while self._next_flip < len(samples):
+            samples[self._next_flip] ^= 1
+            self._next_flip += 1 + self.flip_gap()
+        self._next_flip -= len(samples)
+
+    def bursts(self):
+        # Infinite generator of the samples of a silence and a burst, with the
+        # ground truth of the burst
+        while True:
+            msg, frame = self.message()
+            repetitions = self._rng.randint(*self._repetitions)
+            symbols = process([X2DMessage.Encoder(), X2D.Encoder(), BiphaseMark.Encoder()], [msg] * repetitions)
+            samples = bytearray(self._rng.randint(*self._silence))
+            truth = {"offset": self._offset + len(samples), "frame": frame.hex(), "repetitions": repetitions}
+            samples += self.synthesize(symbols)
+            self.add_noise(samples)
+            self._offset += len(samples)
+            yield samples, truth
+
+    def capture(self, size):
+        # In memory capture of at least size samples
+        samples = bytearray()
+        truths = []
+        for burst, truth in self.bursts():
+            if len(samples) >= size:
+                break
+            samples += burst
+            truths.append(truth)
+        return samples, truths
+
+    def write(self, path, size, truth_path=None):
+        # Stream a capture of at least size samples to path, and its ground
+        # truth as JSON lines to truth_path, only one burst is in memory
+        count = 0
+        with open(path, 'wb') as file, open(truth_path or f"{path}.truth.jsonl", 'w') as truth_file:
+            for burst, truth in self.bursts():
+                if self._offset - len(burst) >= size:
+                    break
+                file.write(burst)
+                truth_file.write(json.dumps(truth) + "\n")
+                count += 1
+        return count
+
+
+def read_truth(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file]
+
+
+def parse_size(size):
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    if size[-1].upper() in units:
+        return int(float(size[:-1]) * units[size[-1].upper()])
+    return int(size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic capture of X2D messages")
+    parser.add_argument("path")
+    parser.add_argument("--size", type=parse_size, default=parse_size("64M"), help="samples, e.g. 64M or 4G")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sample-rate", type=int, default=2000000)
+    parser.add_argument("--symbol-rate", type=int, default=4820)
+    parser.add_argument("--devices", nargs="*", choices=[d.name for d in x2d.Device])
+    parser.add_argument("--data-types", nargs="*", choices=[t.name for t in x2d.MessageDataType])
+    parser.add_argument("--rolling-code", type=float, default=0.5, help="ratio of messages with a rolling code")
+    parser.add_argument("--repetitions", type=int, nargs=2, default=(2, 5))
+    parser.add_argument("--silence", type=int, nargs=2, default=(20000, 200000), help="samples")
+    parser.add_argument("--jitter", type=float, default=0.0, help="relative standard deviation of the pulses")
+    parser.add_argument("--noise", type=float, default=0.0, help="probability of a sample to be flipped")
+    parser.add_argument("--truth", help="ground truth file, <path>.truth.jsonl by default")
+    args = parser.parse_args()
+
+    generator = CaptureGenerator(args.seed, args.sample_rate, args.symbol_rate,
+                                 [x2d.Device[d] for d in args.devices] if args.devices else None,
+                                 [x2d.MessageDataType[t] for t in args.data_types] if args.data_types else None,
+                                 args.rolling_code, tuple(args.repetitions), tuple(args.silence), args.jitter,
+                                 args.noise)
+    count = generator.write(args.path, args.size, args.truth)
+    print(f"{count} bursts written to {args.path}")
+
+
+if __name__ == "__main__":
+    main()